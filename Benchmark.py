@@ -0,0 +1,630 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+import cv2
+
+import Config
+import Utility as util
+import VidProcessor
+from DrawingEngine import DrawingEngine, StrokeCanvas
+from EvaluationEngine import EvaluationEngine, EVALUATION_SIZE_1, EVALUATION_SIZE_2
+from RoundGenerator import RoundGenerator
+from FrameSource import ImageDirectorySource
+from Player import Player
+from StrokeBuffer import StrokeBuffer
+
+# Camera resolutions to benchmark
+RESOLUTIONS = [
+    (640, 480),
+    (1280, 720),
+    (1920, 1080),
+    (3840, 2160),
+]
+
+# Number of same colored blobs per playspace in synthetic frames
+BLOB_COUNTS = [1, 4, 16]
+
+# Recorded frames to replay
+FIXTURE_DIRS = ["images/on", "images/off"]
+
+# Width of the coarse image when the pyramid downscale is picked automatically
+COARSE_WIDTH = 320
+
+# Round lengths (seconds) and camera frame rate of the simulated strokes
+STROKE_SECONDS = [5, 10, 20, 40, 120]
+STROKE_FPS = 60
+
+# Largest change of a target's mean score (out of EvaluationEngine.SCORE_MAX)
+#   that simplified strokes may cause
+SCORE_TOLERANCE = 3.0
+
+# Scoring regression corpus made when no recorded strokes are given: every
+#   target traced for each of these many seconds with each seed
+SCORING_SECONDS = [3, 10]
+SCORING_SEEDS = 2
+# Drawings scored against every target along with the strokes
+SCORING_DRAWINGS = ["test_draw_images/triangle_draw.png", "test_draw_images/triangle_draw_thin.png"]
+# Harshness the game scores with
+SCORING_HARSHNESS = 0.7
+# Largest change of any score against --compare before --scoring fails
+SCORE_DRIFT_TOLERANCE = 0.5
+# Scores of the synthetic corpus, --scoring compares against it when no
+#   --compare or --corpus is given. Refresh it with:
+#   python3 Benchmark.py --scoring -o scoring_baseline.json
+SCORING_BASELINE = "scoring_baseline.json"
+# Full passes over the corpus, the fastest one gives the throughput
+SCORING_PASSES = 3
+
+# Calls used to measure allocations (tracemalloc makes calls a lot slower)
+ALLOC_CALLS = 3
+
+
+# Returns a BGR color in the middle of the calibrated HSV range for a wand color
+def wand_bgr(color):
+    low, high = util.COLOR_HSV[color]
+    mid = [min((l + h) // 2, 255) for l, h in zip(low, high)]
+    if low[0] > high[0]:
+        # Hue range wraps around red
+        mid[0] = (low[0] + high[0] + 180) // 2 % 180
+    pixel = np.array([[mid]], np.uint8)
+    return tuple(int(c) for c in cv2.cvtColor(pixel, cv2.COLOR_HSV2BGR)[0][0])
+
+
+# Builds a dark, noisy frame with `blobs` wand heads per player inside their playspace.
+#   The first blob is the biggest, and blobs are scaled with the frame so it
+#   looks like the same camera shot. Consecutive seeds move the blobs a little,
+#   like consecutive camera frames.
+def synthetic_frame(width, height, blobs=1, seed=0, num_players=None):
+    frame = np.random.RandomState(seed).randint(0, 60, (height, width, 3)).astype(np.uint8)
+    ps = util.playable_space(frame, num_players)
+    radius = max(width // 100, 2)
+    step = seed * max(width // 400, 1)
+    rng = np.random.RandomState(0)
+    for player_num in range(len(ps["spaces"])):
+        color = util.COLOR_ORDER[player_num]
+        space = util.crop_playspace(frame, ps, player_num)
+        for i in range(blobs):
+            r = radius if i == 0 else max(radius // 2, 1)
+            center = (int(rng.randint(r, space.shape[1] - r - step)) + step,
+                      int(rng.randint(r, space.shape[0] - r - step)) + step)
+            cv2.circle(space, center, r, wand_bgr(color), -1)
+    return frame, ps
+
+
+# Calls fn repeat times and returns the duration of each call in seconds
+def time_call(fn, repeat):
+    fn()  # warm up
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+# Returns the average peak memory (bytes) allocated by Python and NumPy during one call.
+#   OpenCV's own allocations are not visible to tracemalloc.
+def alloc_per_call(fn, calls=ALLOC_CALLS):
+    peaks = []
+    for _ in range(calls):
+        tracemalloc.start()
+        fn()
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return float(np.mean(peaks))
+
+
+# Times fn over a list of frames (cycling through them) and summarizes it
+def measure(fn, frames, repeat):
+    it = [0]
+
+    def call():
+        args = frames[it[0] % len(frames)]
+        it[0] += 1
+        return fn(*args)
+
+    durations = np.array(time_call(call, repeat))
+    return {
+        "fps": float(len(durations) / max(durations.sum(), 1e-9)),
+        "p50_ms": float(np.percentile(durations, 50) * 1000),
+        "p95_ms": float(np.percentile(durations, 95) * 1000),
+        "p99_ms": float(np.percentile(durations, 99) * 1000),
+        "alloc_kb": alloc_per_call(call) / 1024,
+    }
+
+
+# Detection paths to benchmark. Each takes (frame, playspace) and does one frame's work.
+def detection_paths():
+    players = range(len(util.COLOR_ORDER))
+
+    def hsv_crops(frame, ps):
+        return [VidProcessor.gaus_and_hsv(util.crop_playspace(frame, ps, i)) for i in players]
+
+    def contours(frame, ps):
+        return [VidProcessor.find_contours_hsv_filter(hsv, util.COLOR_ORDER[i])
+                for i, hsv in zip(players, hsv_crops(frame, ps))]
+
+    t = VidProcessor.WandTracker()
+    history = [Player() for _ in players]
+
+    def tracker(frame, ps):
+        # Feed the tracker's own results back as the players' history
+        coords = t.get_all_coords(frame, ps, history)
+        for p, c in zip(history, coords):
+            p.update_coord(c, time.time())
+        return coords
+
+    paths = {
+        # Whole frame, every color (the debugging path)
+        "handle_frame": (lambda frame, ps: VidProcessor.handle_frame(frame), None),
+        # One call per player with the selected backend, as the game loop used to do
+        "get_coords": (lambda frame, ps: [VidProcessor.get_coords(frame, ps, i) for i in players], None),
+        # Threshold and contours only, on already converted crops
+        "find_wand_hsv_filter": (
+            lambda *hsvs: [VidProcessor.find_wand_hsv_filter(h, util.COLOR_ORDER[i]) for i, h in enumerate(hsvs)],
+            hsv_crops),
+        # Picking the wand out of already found contours
+        "get_points_from_contours": (
+            lambda *cnts: [VidProcessor.get_points_from_contours(c) for c in cnts],
+            contours),
+        "get_all_coords": (VidProcessor.get_all_coords, None),
+        "pyramid": (lambda frame, ps: [VidProcessor.find_wand_pyramid(util.crop_playspace(frame, ps, i), i)
+                                       for i in players], None),
+        "tracker": (tracker, None),
+    }
+    for name, detect in VidProcessor.DETECTOR_BACKENDS.items():
+        paths["backend-" + name] = (
+            lambda frame, ps, detect=detect: [detect(util.crop_playspace(frame, ps, i), i) for i in players],
+            None)
+    return paths
+
+
+# Frames to run every path on: (input name, resolution, blobs, [(frame, playspace)])
+def benchmark_inputs(resolutions, blob_counts):
+    for path in FIXTURE_DIRS:
+        source = ImageDirectorySource(path, fast=True)
+        frames = []
+        while True:
+            ret, frame = source.read()
+            if not ret:
+                break
+            frames.append((frame, util.playable_space(frame)))
+        height, width = frames[0][0].shape[:2]
+        yield path, "%dx%d" % (width, height), None, frames
+
+    for width, height in resolutions:
+        for blobs in blob_counts:
+            frames = [synthetic_frame(width, height, blobs, seed) for seed in range(4)]
+            yield "synthetic", "%dx%d" % (width, height), blobs, frames
+
+
+def run_suite(repeat, resolutions=RESOLUTIONS, blob_counts=BLOB_COUNTS, paths=None):
+    """
+    Runs every detection path over the fixture images and synthetic frames.
+
+    :param repeat: timed calls per measurement
+    :param paths: names of the detection paths to run (default: all)
+    :return: list of result dicts
+    """
+    VidProcessor.get_color_lut()
+
+    results = []
+    for name, resolution, blobs, frames in benchmark_inputs(resolutions, blob_counts):
+        for path, (fn, prepare) in detection_paths().items():
+            if paths and path not in paths:
+                continue
+            # Some paths start from the output of an earlier stage, which is not timed
+            args = [tuple(prepare(*f)) if prepare else f for f in frames]
+            result = {"path": path, "input": name, "resolution": resolution, "blobs": blobs}
+            result.update(measure(fn, args, repeat))
+            results.append(result)
+            print("%-25s %-10s %-10s %5s %8.1f fps  p50 %7.2f  p95 %7.2f  p99 %7.2f ms  %8.1f KB" % (
+                path, name, resolution, blobs if blobs is not None else "-", result["fps"],
+                result["p50_ms"], result["p95_ms"], result["p99_ms"], result["alloc_kb"]))
+    return results
+
+
+def _result_key(result):
+    return (result["path"], result["input"], result["resolution"], result["blobs"])
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares results to a baseline run.
+
+    :param tolerance: allowed slowdown of the p50 latency, ie: 0.2 for 20%
+    :return: list of (result, baseline result) that regressed
+    """
+    previous = {_result_key(r): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        old = previous.get(_result_key(r))
+        if old is not None and r["p50_ms"] > old["p50_ms"] * (1 + tolerance):
+            regressions.append((r, old))
+    return regressions
+
+
+def bench_pyramid(repeat, downscale=None):
+    """
+    Compares full resolution detection with pyramid detection as the camera
+    resolution grows.
+
+    :param repeat: number of timed calls per resolution
+    :param downscale: fixed pyramid downscale, or None to keep the coarse image
+        about COARSE_WIDTH pixels wide
+    """
+    VidProcessor.get_color_lut()
+
+    print("%-10s %10s %10s %10s  %s" % ("camera", "full ms", "pyramid ms", "downscale", "agree"))
+    for width, height in RESOLUTIONS:
+        frame, ps = synthetic_frame(width, height)
+        step = downscale or max(width // COARSE_WIDTH, 1)
+
+        def full():
+            return [VidProcessor.find_wand_label(
+                VidProcessor.classify_frame(util.crop_playspace(frame, ps, i)), i)
+                for i in range(len(util.COLOR_ORDER))]
+
+        def pyramid():
+            return [VidProcessor.find_wand_pyramid(util.crop_playspace(frame, ps, i), i, step)
+                    for i in range(len(util.COLOR_ORDER))]
+
+        full_ms = np.median(time_call(full, repeat)) * 1000
+        pyramid_ms = np.median(time_call(pyramid, repeat)) * 1000
+        print("%-10s %10.2f %10.2f %10d  %s" % ("%dx%d" % (width, height), full_ms, pyramid_ms,
+                                               step, full() == pyramid()))
+
+
+# Wand colors used when benchmarking more players than COLOR_ORDER has
+PLAYER_COLORS = ["yellow", "green", "blue", "red"]
+
+
+def bench_players(repeat, width=1280, height=720):
+    """
+    Compares finding every wand in one shared pass over the frame (the "lut"
+    backend) with one crop-and-convert pass per player (the default
+    "contours" backend), as the player count grows.
+    """
+    saved = list(util.COLOR_ORDER)
+    saved_backend, saved_pyramid = Config.DETECTOR_BACKEND, Config.PYRAMID_DETECTION
+    Config.PYRAMID_DETECTION = False
+    print("%-8s %12s %14s %12s" % ("players", "shared ms", "per player ms", "shared/player"))
+    try:
+        for n in range(1, len(PLAYER_COLORS) + 1):
+            util.COLOR_ORDER[:] = PLAYER_COLORS[:n]
+            VidProcessor.get_color_lut()
+            frames = [synthetic_frame(width, height, seed=seed, num_players=n) for seed in range(4)]
+
+            VidProcessor.set_detector_backend("lut")
+            shared = measure(VidProcessor.get_all_coords, frames, repeat)["p50_ms"]
+            VidProcessor.set_detector_backend("contours")
+            separate = measure(lambda frame, ps: [VidProcessor.detect_contours(util.crop_playspace(frame, ps, i), i)
+                                                  for i in range(n)], frames, repeat)["p50_ms"]
+            print("%-8d %12.2f %14.2f %12.2f" % (n, shared, separate, shared / n))
+    finally:
+        util.COLOR_ORDER[:] = saved
+        Config.DETECTOR_BACKEND, Config.PYRAMID_DETECTION = saved_backend, saved_pyramid
+
+
+# Returns points of a wand tracing the target's outline over and over, with some jitter
+def traced_stroke(target, side, seconds, fps=STROKE_FPS, lap_seconds=4, seed=0):
+    scaled = cv2.resize(target, (side, side))
+    contours = VidProcessor.find_contours(cv2.threshold(scaled, 30, 255, cv2.THRESH_BINARY)[1])
+    outline = max(contours, key=len).reshape(-1, 2).astype(np.float64)
+    n = int(seconds * fps)
+    steps = np.arange(n) * len(outline) / (lap_seconds * fps)
+    points = outline[steps.astype(int) % len(outline)]
+    points += np.random.RandomState(seed).normal(0, 1.0, points.shape)
+    return [(int(x), int(y)) for x, y in np.clip(points, 0, side - 1)]
+
+
+# Returns the score of a drawing of world space points, scored like at the end of a round
+def stroke_score(engine, target, points, seconds):
+    world = Config.WORLD_SPACE_WIDTH
+    binary = DrawingEngine.draw_binary(points, world, world, world)
+    return engine.evaluate(target, binary, seconds, seconds)[1]
+
+
+def bench_strokes(side=390, seeds=3):
+    """
+    Compares raw and simplified strokes: how stored points and drawing costs
+    grow with the round length, and how much simplifying changes the score
+    of every target. Strokes are in world space and shown side pixels wide.
+
+    :return: True if no mean score changed by more than SCORE_TOLERANCE
+    """
+    engine = EvaluationEngine(0.7)
+    color = util.PRIMARY_COLORS[util.COLOR_ORDER[0]]
+    world = Config.WORLD_SPACE_WIDTH
+    saved = Config.SIMPLIFY_STROKES
+
+    def record(points, simplify):
+        Config.SIMPLIFY_STROKES = simplify
+        player = Player()
+        for i, point in enumerate(points):
+            player.update_coord(point, 0.0, i / STROKE_FPS)
+        return player.world_coords
+
+    try:
+        target_name = RoundGenerator.rounds[-1][0]
+        target = RoundGenerator.get_image(target_name)
+        print("Cost, tracing %s" % target_name)
+        print("%-8s %-10s %8s %14s %14s" % ("seconds", "strokes", "points", "per frame ms", "round end ms"))
+        for seconds in STROKE_SECONDS:
+            points = traced_stroke(target, world, seconds)
+            for simplify in (False, True):
+                Config.SIMPLIFY_STROKES = simplify
+                player = Player()
+                canvas = StrokeCanvas(color, world_size=world)
+                start = time.perf_counter()
+                for i, point in enumerate(points):
+                    player.update_coord(point, 0.0, i / STROKE_FPS)
+                    canvas.draw(player.world_coords, side, side)
+                per_frame = (time.perf_counter() - start) / len(points)
+
+                start = time.perf_counter()
+                stroke_score(engine, target, player.world_coords, seconds)
+                round_end = time.perf_counter() - start
+                print("%-8d %-10s %8d %14.3f %14.2f" % (seconds, "simplified" if simplify else "raw",
+                                                       len(player.world_coords), per_frame * 1000, round_end * 1000))
+
+        # The score is taken on a 32x32 grid, so moving a whole drawing by a
+        #   single unit can already change it by several points
+        seconds = STROKE_SECONDS[len(STROKE_SECONDS) // 2]
+        print("\nMean score over %d strokes of %d seconds (tolerance %.1f)" % (seeds, seconds, SCORE_TOLERANCE))
+        print("%-15s %8s %11s %8s %16s" % ("target", "raw", "simplified", "change", "1 unit shift"))
+        passed = True
+        for target_name, _ in RoundGenerator.rounds:
+            target = RoundGenerator.get_image(target_name)
+            raw, simplified, shifted = [], [], []
+            for seed in range(seeds):
+                points = traced_stroke(target, world, seconds, seed=seed)
+                raw.append(stroke_score(engine, target, record(points, False), seconds))
+                simplified.append(stroke_score(engine, target, record(points, True), seconds))
+                shifted.append(stroke_score(engine, target, [(x + 1, y) for x, y in points], seconds))
+            change = np.mean(simplified) - np.mean(raw)
+            ok = abs(change) <= SCORE_TOLERANCE
+            passed = passed and ok
+            print("%-15s %8.2f %11.2f %+8.2f %+16.2f  %s" % (target_name, np.mean(raw), np.mean(simplified), change,
+                                                          np.mean(shifted) - np.mean(raw), "ok" if ok else "FAIL"))
+    finally:
+        Config.SIMPLIFY_STROKES = saved
+    return passed
+
+
+def synthetic_corpus():
+    """
+    :return: [(stroke id, StrokeBuffer)] of wands tracing every target
+    """
+    world = Config.WORLD_SPACE_WIDTH
+    corpus = []
+    for target_name, _ in RoundGenerator.rounds:
+        target = RoundGenerator.get_image(target_name)
+        for seconds in SCORING_SECONDS:
+            for seed in range(SCORING_SEEDS):
+                points = traced_stroke(target, world, seconds, seed=seed)
+                stroke = StrokeBuffer.from_json({"points": points, "times": [i / STROKE_FPS for i in range(len(points))]})
+                corpus.append(("%s %ds seed %d" % (target_name, seconds, seed), stroke))
+    return corpus
+
+
+def load_corpus(path):
+    """
+    :param path: JSON lines file of recorded strokes (see Config.STROKE_CORPUS)
+    :return: [(stroke id, StrokeBuffer)]
+    """
+    corpus = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if line.strip():
+                record = json.loads(line)
+                stroke_id = "%d: %s round %s player %s" % (line_number, record.get("target"),
+                                                           record.get("round"), record.get("player"))
+                corpus.append((stroke_id, StrokeBuffer.from_json(record)))
+    return corpus
+
+
+# Returns the SCORING_DRAWINGS as world size binary images, by file name
+def scoring_drawings():
+    world = Config.WORLD_SPACE_SIZE
+    drawings = []
+    for path in SCORING_DRAWINGS:
+        img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if img is not None:
+            drawings.append((path, cv2.threshold(cv2.resize(img, world), 30, 255, cv2.THRESH_BINARY)[1]))
+    return drawings
+
+
+def bench_scoring(corpus_path=None, repeat=50):
+    """
+    Replays every stroke of a corpus and scores it against every round
+    target, like the end of a round: DrawingEngine.draw_binary at world size
+    and then EvaluationEngine.evaluate.
+
+    :param corpus_path: recorded strokes, defaults to synthetic_corpus()
+    :param repeat: timed calls per stage
+    :return: {"settings", "scores", "stages", "evals_per_second"}. Scores
+        are keyed by "<drawing> | <target>".
+    """
+    engine = EvaluationEngine(SCORING_HARSHNESS)
+    world = Config.WORLD_SPACE_WIDTH
+    corpus = load_corpus(corpus_path) if corpus_path else synthetic_corpus()
+    targets = [RoundGenerator.get_target(name) for name in sorted(set(n for n, _ in RoundGenerator.rounds))]
+
+    drawings = [(stroke_id, DrawingEngine.draw_binary(stroke, world, world, world)) for stroke_id, stroke in corpus]
+    drawings += scoring_drawings()
+    scores = {}
+    for drawing_id, drawing in drawings:
+        for target in targets:
+            scores["%s | %s" % (drawing_id, target.name)] = float(engine.evaluate(target, drawing, 0, 0)[1])
+
+    # Stage timings, cycling through the corpus
+    strokes = [(stroke,) for _, stroke in corpus]
+    images = [(drawing,) for _, drawing in drawings]
+    pairs = [(target, drawing) for _, drawing in drawings for target in targets]
+    stages = {
+        "draw_binary": measure(lambda stroke: DrawingEngine.draw_binary(stroke, world, world, world), strokes, repeat),
+        "pre_process": measure(EvaluationEngine._pre_process, images, repeat),
+        "evaluate": measure(lambda target, drawing: engine.evaluate(target, drawing, 0, 0), pairs, repeat),
+    }
+
+    # Throughput of whole passes: every stroke drawn once and scored against every target
+    passes = []
+    for _ in range(SCORING_PASSES):
+        start = time.perf_counter()
+        for _, stroke in corpus:
+            drawing = DrawingEngine.draw_binary(stroke, world, world, world)
+            for target in targets:
+                engine.evaluate(target, drawing, 0, 0)
+        passes.append(time.perf_counter() - start)
+    evals_per_second = len(corpus) * len(targets) / max(min(passes), 1e-9)
+
+    print("%d strokes and %d drawings against %d targets" % (len(corpus), len(drawings) - len(corpus), len(targets)))
+    print("%-12s %10s %10s %10s" % ("stage", "p50 ms", "p95 ms", "alloc kB"))
+    for name, stage in stages.items():
+        print("%-12s %10.3f %10.3f %10.1f" % (name, stage["p50_ms"], stage["p95_ms"], stage["alloc_kb"]))
+    print("%.0f evaluations per second (drawing included)" % evals_per_second)
+
+    return {
+        "settings": {"evaluation_sizes": [list(EVALUATION_SIZE_1), list(EVALUATION_SIZE_2)],
+                     "harshness": SCORING_HARSHNESS, "world_size": world,
+                     "corpus": corpus_path or "synthetic"},
+        "scores": scores,
+        "stages": stages,
+        "evals_per_second": evals_per_second,
+    }
+
+
+def compare_scoring(results, baseline, tolerance, score_tolerance=SCORE_DRIFT_TOLERANCE):
+    """
+    Compares a bench_scoring run to a baseline run.
+
+    :param tolerance: allowed drop in evaluations per second, ie: 0.2 for 20%,
+        or None to only report throughput (ie: a baseline from another machine)
+    :param score_tolerance: allowed change of any score
+    :return: list of failure messages
+    """
+    failures = []
+    if results["settings"] != baseline["settings"]:
+        print("Settings changed since the baseline: %s -> %s" % (baseline["settings"], results["settings"]))
+
+    drift = []
+    for key, score in sorted(results["scores"].items()):
+        old = baseline["scores"].get(key)
+        if old is not None:
+            drift.append(abs(score - old))
+            if abs(score - old) > score_tolerance:
+                failures.append("SCORE DRIFT %s: %.2f -> %.2f" % (key, old, score))
+    missing = set(baseline["scores"]) - set(results["scores"])
+    if missing and results["settings"]["corpus"] == baseline["settings"]["corpus"]:
+        failures += ["MISSING SCORE %s" % key for key in sorted(missing)]
+    elif missing:
+        print("%d scores of the baseline were not run (another corpus?)" % len(missing))
+    added = set(results["scores"]) - set(baseline["scores"])
+    if added:
+        print("%d scores are not in the baseline yet" % len(added))
+    if drift:
+        print("Score drift over %d scores: mean %.3f, max %.3f (tolerance %.2f)" % (
+            len(drift), np.mean(drift), np.max(drift), score_tolerance))
+
+    old_rate = baseline["evals_per_second"]
+    print("Throughput: %.0f -> %.0f evaluations per second" % (old_rate, results["evals_per_second"]))
+    if tolerance is not None and results["evals_per_second"] < old_rate * (1 - tolerance):
+        failures.append("THROUGHPUT %.0f -> %.0f evaluations per second" % (old_rate, results["evals_per_second"]))
+    for name, stage in results["stages"].items():
+        old = baseline["stages"].get(name)
+        if old is not None:
+            print("  %-12s p50 %.3f ms -> %.3f ms" % (name, old["p50_ms"], stage["p50_ms"]))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark wand detection')
+    parser.add_argument("-n", type=int, default=50,
+                        help="timed calls per measurement")
+    parser.add_argument("-p", "--path", action='append',
+                        help="only run this detection path (can be repeated)")
+    parser.add_argument("-o", "--output", help="save the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against "
+                                          "(--scoring default: %s)" % SCORING_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed p50 slowdown against --compare before failing (default: 0.2)")
+    parser.add_argument("--pyramid", action='store_true',
+                        help="only compare full and pyramid detection across resolutions")
+    parser.add_argument("--downscale", type=int, default=None,
+                        help="fixed pyramid downscale for --pyramid (default: scale with resolution)")
+    parser.add_argument("--players", action='store_true',
+                        help="only compare shared and per player detection for 1 to 4 players")
+    parser.add_argument("--strokes", action='store_true',
+                        help="only compare raw and simplified strokes as rounds get longer")
+    parser.add_argument("--scoring", action='store_true',
+                        help="only score a stroke corpus against every target: score drift and throughput")
+    parser.add_argument("--corpus", help="recorded strokes for --scoring (see Config.STROKE_CORPUS)")
+    parser.add_argument("--score-tolerance", type=float, default=SCORE_DRIFT_TOLERANCE,
+                        help="allowed change of any score against --compare with --scoring (default: %.1f)"
+                             % SCORE_DRIFT_TOLERANCE)
+    args = parser.parse_args()
+
+    if args.pyramid:
+        bench_pyramid(args.n, args.downscale)
+        return
+    if args.players:
+        bench_players(args.n)
+        return
+    if args.strokes:
+        if not bench_strokes():
+            sys.exit(1)
+        return
+    if args.scoring:
+        results = bench_scoring(args.corpus, args.n)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(dict(results, time=time.strftime("%Y-%m-%dT%H:%M:%S"), platform=platform.platform(),
+                               opencv=cv2.__version__), f, indent=2)
+            print("Saved results to %s" % args.output)
+        # The committed baseline comes from another machine, only its scores are checked
+        compare_path, tolerance = args.compare, args.tolerance
+        if compare_path is None and args.corpus is None and args.output != SCORING_BASELINE:
+            compare_path, tolerance = SCORING_BASELINE, None
+        if compare_path:
+            with open(compare_path) as f:
+                failures = compare_scoring(results, json.load(f), tolerance, args.score_tolerance)
+            for failure in failures:
+                print(failure)
+            if failures:
+                sys.exit(1)
+            print("No regressions against %s" % compare_path)
+        return
+
+    results = run_suite(args.n, paths=args.path)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "platform": platform.platform(),
+                "python": platform.python_version(),
+                "opencv": cv2.__version__,
+                "repeat": args.n,
+                "results": results,
+            }, f, indent=2)
+        print("Saved results to %s" % args.output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for r, old in regressions:
+            print("REGRESSION %s %s %s blobs=%s: p50 %.2f ms -> %.2f ms" % (
+                r["path"], r["input"], r["resolution"], r["blobs"], old["p50_ms"], r["p50_ms"]))
+        if regressions:
+            sys.exit(1)
+        print("No regressions against %s" % args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,24 +4,44 @@ import argparse
 import time
 import pdb
 
+import Config
+import FrameSource
+import Profiles
 import Utility as util
 from VidProcessor import *
 
 # https://docs.opencv.org/3.4/da/d6a/tutorial_trackbar.html
 
+# Pixels at least this bright (HSV value) are wand candidates during auto calibration
+AUTO_MIN_VALUE = 200
+
+# Share of each wand's pixels the fitted ranges cover, and how much the ranges
+#   are widened on every side afterwards
+AUTO_COVERAGE = 0.95
+AUTO_MARGIN = 5
+
 # Handles calibrating the sensitivity and thresholds
 class Calibration:
     # This means we are using calibration
-    def __init__(self):
+    def __init__(self, profile=None):
+        """
+        :param profile: lighting profile to load, and to save to with 's'
+        """
         cv2.namedWindow("calibration", cv2.WINDOW_NORMAL)
-        self.players = [
-            PlayerCalibration("Player 1", util.COLOR_ORDER[0]),
-            PlayerCalibration("Player 2", util.COLOR_ORDER[1])]
+        self.profile = profile
+        if profile is not None and profile in Profiles.list_profiles():
+            Profiles.load_profile(profile)
+            print("Loaded lighting profile %s" % profile)
+
+        self.players = [PlayerCalibration("Player %d" % (i + 1), util.COLOR_ORDER[i])
+                        for i in range(Config.NUM_PLAYERS)]
         for p in self.players:
             p.draw_tracks("calibration")
 
         cv2.setMouseCallback("calibration", self.calibrate)
         self.last_frame = None
+        self.last_playspace = None
+        self.recording = False
 
         tolerance = "Tolerance"
         self.tolerance = 10
@@ -42,17 +62,50 @@ class Calibration:
         self.tolerance = value
         print("Tolerance is %d" % self.tolerance)
 
+    # Starts gathering wand histograms, or fits every player's range from them
+    def toggle_auto(self):
+        if not self.recording:
+            for p in self.players:
+                p.histogram.reset()
+            self.recording = True
+            print("Auto calibration: hold each wand up in its playspace, press 'a' again when done")
+            return
+
+        self.recording = False
+        for p in self.players:
+            hsv_range = p.histogram.fit()
+            if hsv_range is None:
+                print("%s: no wand seen, keeping %s" % (p.name, util.COLOR_HSV[p.color]))
+                continue
+            util.COLOR_HSV[p.color] = hsv_range
+            print("Calibrate %s to %s from %d pixels in %d frames" % (
+                p.color, hsv_range, p.histogram.pixels, p.histogram.frames))
+
+    def save(self):
+        if self.profile is None:
+            print("Start with --profile NAME to save a lighting profile")
+            return
+        print("Saved lighting profile to %s" % Profiles.save_profile(self.profile))
+
     def handle_frame(self, frame):
+        if Config.FLIP_IMAGE:
+            # Same as the game, so playspaces line up
+            frame = cv2.flip(frame, 1)
         self.last_frame = frame
+        ps = util.playable_space(frame)
+        self.last_playspace = ps
 
         hsv = gaus_and_hsv(frame)
 
+        if self.recording:
+            for i, p in enumerate(self.players):
+                p.histogram.add(util.crop_playspace(hsv, ps, i))
+
         # Find wand top (if exists)
-        points = []
         final = [ [] for i in range(len(self.players))]
 
-        for i in range(0, len(util.COLOR_ORDER)-1):
-            c = util.COLOR_ORDER[i]
+        for i, p in enumerate(self.players):
+            c = p.color
             pixel_map = find_pixel_range(hsv, c)
             cv2.imshow(c, pixel_map)
             contours = find_contours_hsv_filter(hsv, c)
@@ -60,27 +113,107 @@ class Calibration:
                 if cv2.contourArea(c) > 0:
                     final[i].append(c)
     
-        cnt = frame
+        cnt = util.draw_playspace(frame.copy(), ps)
         for i in range(len(final)):
             cnt = util.draw_contours(cnt, final[i], (0, 0, 0), 1)
+        if self.recording:
+            cv2.putText(cnt, "Recording %d frames" % self.players[0].histogram.frames, (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
         cv2.imshow("calibration", cnt)
 
     def calibrate(self, event, x, y, flags, param):
         # if the left mouse button was clicked
         if event == cv2.EVENT_LBUTTONDOWN:
             print(self.last_frame[y][x])
-            self.set_hsv_range(self.players[0], self.last_frame[y][x])
-            pass
+            # Calibrate the player whose playspace was clicked
+            for player, (tl, br) in zip(self.players, self.last_playspace["spaces"]):
+                if tl[0] <= x < br[0] and tl[1] <= y < br[1]:
+                    self.set_hsv_range(player, self.last_frame[y][x])
 
         elif event == cv2.EVENT_RBUTTONDOWN:
             pass
 
 
+class WandHistogram:
+    """
+    Hue, saturation and value histograms of one wand, gathered over many
+    frames. Every frame only adds the pixels of the biggest bright blob in
+    the player's playspace.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.hue = np.zeros(180, np.int64)
+        self.sat = np.zeros(256, np.int64)
+        self.val = np.zeros(256, np.int64)
+        self.frames = 0
+        self.pixels = 0
+
+    def add(self, hsv):
+        """
+        :param hsv: HSV image of the player's playspace
+        """
+        self.frames += 1
+        bright = (hsv[..., 2] >= AUTO_MIN_VALUE).view(np.uint8)
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(bright, connectivity=8)
+        if count < 2:
+            return
+        biggest = 1 + np.argmax(stats[1:, cv2.CC_STAT_AREA])
+        if stats[biggest, cv2.CC_STAT_AREA] < MIN_WAND_PIXELS:
+            return
+
+        pixels = hsv[labels == biggest]
+        self.hue += np.bincount(pixels[:, 0], minlength=180)[:180]
+        self.sat += np.bincount(pixels[:, 1], minlength=256)
+        self.val += np.bincount(pixels[:, 2], minlength=256)
+        self.pixels += len(pixels)
+
+    def fit(self, coverage=AUTO_COVERAGE, margin=AUTO_MARGIN):
+        """
+        :return: [(h, s, v), (h, s, v)] range like util.COLOR_HSV, or None if no wand was seen.
+            The hue range wraps around red when the lower hue is above the upper hue.
+        """
+        if self.pixels == 0:
+            return None
+        h_low, h_high = fit_hue(self.hue, coverage)
+        if (h_high - h_low) % 180 + 2 * margin >= 179:
+            h_low, h_high = 0, 179
+        else:
+            h_low, h_high = (h_low - margin) % 180, (h_high + margin) % 180
+        s_low, s_high = fit_percentiles(self.sat, coverage)
+        v_low, v_high = fit_percentiles(self.val, coverage)
+        return [(int(h_low), int(max(s_low - margin, 0)), int(max(v_low - margin, 0))),
+                (int(h_high), int(min(s_high + margin, 255)), int(min(v_high + margin, 255)))]
+
+
+# Returns the (low, high) bins between which the middle coverage of a histogram lies
+def fit_percentiles(hist, coverage):
+    cdf = np.cumsum(hist) / hist.sum()
+    tail = (1 - coverage) / 2
+    return int(np.searchsorted(cdf, tail)), int(np.searchsorted(cdf, 1 - tail))
+
+# Returns the (low, high) hues of the narrowest hue range that covers coverage
+#   of a hue histogram. Hue is circular, so low is above high when the range
+#   wraps around red.
+def fit_hue(hist, coverage):
+    bins = len(hist)
+    target = coverage * hist.sum()
+    # Sums of every window that starts at each hue, for growing window widths
+    cum = np.concatenate(([0], np.cumsum(np.concatenate((hist, hist)))))
+    for width in range(1, bins + 1):
+        sums = cum[width:width + bins] - cum[:bins]
+        start = int(np.argmax(sums))
+        if sums[start] >= target:
+            return start, (start + width - 1) % bins
+    return 0, bins - 1
+
 
 class PlayerCalibration:
     def __init__(self, name, color):
         self.name = name
         self.color = color
+        self.histogram = WandHistogram()
 
     def draw_tracks(self, win):
         return
@@ -115,6 +248,9 @@ def main():
                         help="use camera instead of image")
     parser.add_argument('-v', metavar='VIDEO_CAME', type=int,
                         help='Choose video camera', default=0)
+    parser.add_argument("-s", help="video file or directory of images to use instead of a camera")
+    parser.add_argument("-p", "--profile",
+                        help="lighting profile to start from, and to save to with 's'")
     args = parser.parse_args()
 
     # cv2.namedWindow("painted", cv2.WINDOW_NORMAL)
@@ -125,7 +261,10 @@ def main():
     # cv2.resizeWindow("debug", (900, 900))
 
 
-    if args.c == False:
+    if args.s is not None:
+        print("Using source: %s" % args.s)
+        handle_source(FrameSource.open_source(args.s, loop=True), args.profile)
+    elif args.c == False:
         print("Using single image: %s" % args.i)
         points = handle_single_img(args.i)
         final = img = cv2.imread(args.i)
@@ -135,21 +274,27 @@ def main():
         cv2.waitKey(0)
     else:
         print("Using video camera")
-        handle_webcam(args.v)
+        handle_webcam(args.v, args.profile)
 
 # Used for debugging to use the webcam
-def handle_webcam(cam):
-    cali = Calibration()
-    cap = cv2.VideoCapture(cam)
+def handle_webcam(cam, profile=None):
     # uvcdynctrl -f
     # cap.set(3,800) # Width
     # cap.set(4,600) # Height
+    handle_source(FrameSource.CameraSource(cam), profile)
+
+# Calibrates from any frame source (camera, video file, directory of images)
+#   Keys: 'a' starts and stops auto calibration, 's' saves the lighting profile
+def handle_source(cap, profile=None):
+    cali = Calibration(profile)
     # 3 Wand types
     points = [[], [], []]
     last_point = [time.time(), time.time(), time.time()]
     while(True):
         # Capture frame-by-frame
         ret, frame = cap.read()
+        if not ret:
+            break
         cali.handle_frame(frame)
 
         # cv2.imshow('debug', gray)
@@ -158,6 +303,10 @@ def handle_webcam(cam):
             break
         if key & 0xFF == ord('c') or key & 0xFF == ord(' '):
             points = [[], [], []]
+        if key & 0xFF == ord('a'):
+            cali.toggle_auto()
+        if key & 0xFF == ord('s'):
+            cali.save()
 
 
     # When everything done, release the capture
@@ -0,0 +1,107 @@
+import collections
+import threading
+import time
+
+# Number of frames kept in the ring buffer. Older frames are dropped.
+RING_SIZE = 2
+
+# A captured frame, stamped with a sequence number and a time.monotonic() timestamp
+Frame = collections.namedtuple("Frame", ["image", "seq", "timestamp"])
+
+
+class ThreadedCapture:
+    """
+    Reads frames from a capture on a dedicated thread into a small ring
+    buffer, so camera I/O overlaps with processing. The game loop always
+    gets the newest frame. Frames it was too slow to see are counted as
+    dropped, and frames it sees twice (it is faster than the camera) are
+    counted as duplicated.
+    """
+
+    def __init__(self, cap, ring_size=RING_SIZE):
+        """
+        :param cap: anything with read() and release(), usually a cv2.VideoCapture
+        :param ring_size: number of recent frames to keep
+        """
+        self.cap = cap
+        self._ring = collections.deque(maxlen=ring_size)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._finished = False
+        self._last_seq = -1
+
+        self.captured = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.duplicated = 0
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="capture", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        seq = 0
+        while self._running:
+            ret, image = self.cap.read()
+            timestamp = time.monotonic()
+            with self._cond:
+                if not ret:
+                    self._finished = True
+                    self._cond.notify_all()
+                    return
+                self._ring.append(Frame(image, seq, timestamp))
+                self.captured += 1
+                self._cond.notify_all()
+            seq += 1
+
+    def read_frame(self, timeout=None):
+        """
+        Returns the newest frame without waiting for the camera, except for
+        the very first frame.
+
+        :param timeout: seconds to wait for the first frame (None waits forever)
+        :return: Frame, or None if the capture has ended
+        """
+        with self._cond:
+            if not self._ring:
+                self._cond.wait_for(lambda: self._ring or self._finished, timeout)
+                if not self._ring:
+                    return None
+
+            frame = self._ring[-1]
+            if frame.seq == self._last_seq:
+                if self._finished:
+                    return None
+                self.duplicated += 1
+            else:
+                self.dropped += frame.seq - self._last_seq - 1
+                self._last_seq = frame.seq
+            self.delivered += 1
+        # The caller may draw on frames it is given, so the ring keeps the
+        #   untouched image and every delivery is a copy of it
+        return frame._replace(image=frame.image.copy())
+
+    def read(self):
+        """
+        Drop-in replacement for cv2.VideoCapture.read()
+
+        :return: (ret, image) for the newest frame
+        """
+        frame = self.read_frame()
+        if frame is None:
+            return False, None
+        return True, frame.image
+
+    def release(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.cap.release()
+
+    def report(self):
+        return "capture: %d captured, %d delivered, %d dropped, %d duplicated" % (
+            self.captured, self.delivered, self.dropped, self.duplicated)
@@ -13,4 +13,55 @@ WORLD_SPACE_SIZE = (WORLD_SPACE_WIDTH, WORLD_SPACE_WIDTH)
 PLAYER_ONE = 0
 PLAYER_TWO = 1
 
-DRAW_TIMEOUT = 0.3
\ No newline at end of file
+# Lighting profile (see Profiles.py) loaded at startup, None keeps the ranges in Utility.COLOR_HSV
+LIGHTING_PROFILE = None
+
+# Number of players. Playspaces are laid out on a grid, and Utility.COLOR_ORDER
+#   needs a calibrated color for every player.
+NUM_PLAYERS = 2
+
+DRAW_TIMEOUT = 0.3
+
+# Simplify strokes as they are drawn: points within SIMPLIFY_TOLERANCE (in
+#   world space, about a pixel) of a straight line are merged, and a stroke never has more than
+#   MAX_STROKE_POINTS points in a round
+SIMPLIFY_STROKES = True
+SIMPLIFY_TOLERANCE = 1
+MAX_STROKE_POINTS = 2000
+
+# JSON lines file every player's strokes are appended to at the end of each
+#   round, to build a corpus for `Benchmark.py --scoring`. None records nothing.
+STROKE_CORPUS = None
+
+# Stroke smoothing filter (see Smoothing.SMOOTHERS): "moving_average", "exponential" or "one_euro"
+SMOOTHING_FILTER = "moving_average"
+
+# Search around each wand's predicted position instead of the whole playspace
+WAND_TRACKER = True
+
+# Find wand candidates on a frame sampled every PYRAMID_DOWNSCALE pixels and
+#   only refine them at full resolution. Use for 1080p and larger cameras,
+#   with the "lut" backend.
+PYRAMID_DETECTION = False
+PYRAMID_DOWNSCALE = 4
+
+# Read camera frames on a separate thread so capture overlaps with processing
+THREADED_CAPTURE = True
+
+# Seconds of extra latency of each camera in multi-camera mode, in camera
+#   order. Subtracted from capture timestamps so the cameras line up.
+CAMERA_OFFSETS = []
+
+# Number of worker processes running wand detection (0 detects in the game loop).
+#   Workers detect one frame behind the game loop, so capture and detection overlap.
+DETECTION_WORKERS = 0
+
+# Wand detector backend (see VidProcessor.DETECTOR_BACKENDS):
+#   "lut", "contours", "components" or "grayscale". "contours" is the fastest
+#   one that tells the wand colors apart in `python3 Benchmark.py -p backend-...`
+DETECTOR_BACKEND = "contours"
+
+# Reuse a player's last detection while their playspace is not changing
+MOTION_GATE = True
+# Change in any color channel (0-255) that counts as motion
+MOTION_THRESHOLD = 40
@@ -0,0 +1,204 @@
+import multiprocessing
+import numpy as np
+import cv2
+
+import Config
+import Utility as util
+import VidProcessor
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:
+    # multiprocessing.shared_memory was added in Python 3.8
+    shared_memory = None
+
+# Number of shared frame buffers. A buffer is only reused once every
+#   result for the frame in it has been collected.
+FRAME_SLOTS = 2
+
+
+def _color_settings():
+    # The wand colors and their HSV ranges, sent along with every task
+    return list(util.COLOR_ORDER), {c: [tuple(low), tuple(high)] for c, (low, high) in util.COLOR_HSV.items()}
+
+
+def _worker(tasks, results):
+    """
+    Detection worker process. Reads frames straight out of shared memory and
+    returns (seq, player_num, coord) for every task.
+    """
+    frames = {}
+    colors = None
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        seq, shm_name, shape, playspace, player_num, backend, task_colors = task
+        Config.DETECTOR_BACKEND = backend
+        if task_colors != colors:
+            # Calibration or a lighting profile changed the colors. Every
+            #   backend reads the ranges, the lut backend rebuilds its tables.
+            colors = task_colors
+            util.COLOR_ORDER[:] = colors[0]
+            util.COLOR_HSV.update(colors[1])
+
+        if shm_name not in frames:
+            shm = shared_memory.SharedMemory(name=shm_name)
+            frames[shm_name] = (shm, np.ndarray(shape, np.uint8, buffer=shm.buf))
+        frame = frames[shm_name][1]
+
+        cropped = util.crop_playspace(frame, playspace, player_num)
+        results.put((seq, player_num, VidProcessor.find_wand_bgr(cropped, player_num)))
+
+    # Drop the numpy views before closing the shared memory behind them
+    frame = cropped = None
+    for name in list(frames):
+        shm = frames.pop(name)[0]
+        shm.close()
+
+
+class DetectionPool:
+    """
+    Runs wand detection for each player in its own worker process. Frames
+    are published into shared memory buffers (the flip, if any, writes
+    directly into the buffer) so workers never copy or unpickle an image.
+    The game keeps drawing on its own frame, which publish mirrors in place.
+    Results are tagged with the frame sequence number and handed back in
+    frame order.
+
+    get_all_coords is pipelined: the workers detect in one frame while the
+    game loop reads and draws the next, and the detections it returns are
+    the previous frame's.
+    """
+
+    def __init__(self, workers, slots=FRAME_SLOTS):
+        """
+        :param workers: number of worker processes
+        :param slots: number of shared frame buffers
+        """
+        if shared_memory is None:
+            raise RuntimeError("DetectionPool requires Python 3.8 or newer (multiprocessing.shared_memory)")
+
+        self._slots = [None] * slots
+        self._shape = None
+        self._seq = -1
+        self._pending = {}
+        self._done = {}
+        # Sequence number of the frame whose detections the next get_all_coords returns
+        self._in_flight = None
+
+        # Workers must share this process's resource tracker. One started by a
+        #   worker would unlink the frame buffers when that worker exits.
+        resource_tracker.ensure_running()
+
+        self._tasks = multiprocessing.Queue()
+        self._results = multiprocessing.Queue()
+        self._workers = []
+        for _ in range(workers):
+            p = multiprocessing.Process(target=_worker, daemon=True, args=(self._tasks, self._results))
+            p.start()
+            self._workers.append(p)
+
+    def publish(self, image, flip=False):
+        """
+        Publishes a frame to the workers.
+
+        :param image: BGR frame
+        :param flip: mirror the image while writing it into shared memory
+        :return: the published frame in the caller's own image array (image,
+            mirrored in place when flipping), for the caller to draw on.
+            Workers read the shared copy while the next frame is drawn, so
+            the shared buffer itself is never handed out.
+        """
+        if self._shape is None:
+            self._shape = image.shape
+            for i in range(len(self._slots)):
+                shm = shared_memory.SharedMemory(create=True, size=image.nbytes)
+                self._slots[i] = (shm, np.ndarray(image.shape, np.uint8, buffer=shm.buf))
+        elif image.shape != self._shape:
+            raise ValueError("Frame size changed from {} to {}".format(self._shape, image.shape))
+
+        self._seq += 1
+        slot = self._seq % len(self._slots)
+
+        # Never overwrite a frame a worker may still be reading
+        for seq in [s for s in self._pending if s % len(self._slots) == slot]:
+            self._wait(seq)
+
+        shared = self._slots[slot][1]
+        if flip:
+            cv2.flip(image, 1, shared)
+            np.copyto(image, shared)
+        else:
+            np.copyto(shared, image)
+        return image
+
+    def submit(self, playspace):
+        """
+        Queues detection of every player's wand in the last published frame.
+
+        :param playspace: playspace of the frame
+        :return: sequence number to collect
+        """
+        shm = self._slots[self._seq % len(self._slots)][0]
+        players = len(playspace["spaces"])
+        colors = _color_settings()
+        for player_num in range(players):
+            self._tasks.put((self._seq, shm.name, self._shape, playspace, player_num,
+                             Config.DETECTOR_BACKEND, colors))
+        self._pending[self._seq] = players
+        self._done[self._seq] = [None] * players
+        return self._seq
+
+    def _wait(self, seq):
+        # Waits for every result of a submitted frame, leaving them to be collected
+        while self._pending.get(seq, 0) > 0:
+            done_seq, player_num, coord = self._results.get()
+            self._done[done_seq][player_num] = coord
+            self._pending[done_seq] -= 1
+
+    def collect(self, seq):
+        """
+        Waits for every result of a submitted frame.
+
+        :param seq: sequence number returned by submit
+        :return: list of pixel_coord (or None), indexed by player number
+        """
+        self._wait(seq)
+        self._pending.pop(seq, None)
+        return self._done.pop(seq)
+
+    def get_all_coords(self, frame, playspace):
+        """
+        Same as VidProcessor.get_all_coords, one frame late: submits the frame
+        returned by publish and returns the detections of the frame published
+        before it. When that frame was not submitted (ie: the first frame of a
+        round), there are no detections yet and every coord is None.
+        """
+        seq = self.submit(playspace)
+        previous, self._in_flight = self._in_flight, seq
+        if previous == seq - 1:
+            return self.collect(previous)
+        if previous is not None:
+            # Left over from frames that were not detected in, too old to use
+            self.collect(previous)
+        return [None] * len(playspace["spaces"])
+
+    def close(self):
+        # Workers only exit once their results have been read
+        for seq in list(self._pending):
+            self.collect(seq)
+        self._in_flight = None
+
+        for _ in self._workers:
+            self._tasks.put(None)
+        for p in self._workers:
+            p.join()
+        self._workers = []
+
+        # Drop the numpy views before closing the shared memory behind them
+        shms = [s[0] for s in self._slots if s is not None]
+        self._slots = [None] * len(self._slots)
+        for shm in shms:
+            shm.close()
+            shm.unlink()
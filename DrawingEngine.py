@@ -2,52 +2,73 @@ from DebugUtils import display_all_img
 import cv2
 import numpy as np
 import math
-import pandas as pd
+import collections
+import Config
+import Smoothing
+from StrokeBuffer import StrokeBuffer
 
 
 class DrawingEngine:
+    # Stroke thickness in pixels, for points in pixels
+    LINE_THICKNESS = 20
+    # Stroke thickness in world units, for points in world space. The
+    #   LINE_THICKNESS strokes were drawn on the 390 pixel playspaces of 2
+    #   players on an 800x600 camera, 20 * 500 / 390 world units.
+    WORLD_LINE_THICKNESS = 26
+
     @staticmethod
-    def draw(points, img_wid, img_hei, color):
+    def draw(points, img_wid, img_hei, color, world_size=None):
+        """
+        :param world_size: width of the world space the points are in, they are
+            scaled to the image. None when the points are already in pixels.
+        """
         img = DrawingEngine._blank_img_of_size(img_wid, img_hei)
-        DrawingEngine._draw_lines(img, points, color)
+        DrawingEngine._draw_lines(img, points, color, world_size)
         return img
 
     @staticmethod
-    def draw_binary(points, img_wid, img_hei):
+    def draw_binary(points, img_wid, img_hei, world_size=None):
         img = DrawingEngine._blank_1_ch_img_of_size(img_wid, img_hei)
-        DrawingEngine._draw_lines(img, points, 255)
+        DrawingEngine._draw_lines(img, points, 255, world_size)
         return img
 
     @staticmethod
-    def _draw_line(img, p1, p2, color):
-        cv2.line(img, p1, p2, color, thickness=20, lineType=8)
+    def _scale(img, world_size):
+        """
+        :return: (x scale, y scale, line thickness) to draw points of the given world size on img
+        """
+        if world_size is None:
+            return 1.0, 1.0, DrawingEngine.LINE_THICKNESS
+        sx = img.shape[1] / world_size
+        sy = img.shape[0] / world_size
+        return sx, sy, max(int(round(DrawingEngine.WORLD_LINE_THICKNESS * min(sx, sy))), 1)
+
+    @staticmethod
+    def _draw_line(img, p1, p2, color, thickness=LINE_THICKNESS):
+        cv2.line(img, p1, p2, color, thickness=thickness, lineType=8)
 
     @staticmethod
-    def _draw_lines(img, points, color):
-        points = DrawingEngine._smooth(points)
+    def _draw_lines(img, points, color, world_size=None):
+        if isinstance(points, StrokeBuffer):
+            # Smooth the arrays directly instead of a list of tuples
+            smoothed = Smoothing.make_smoother().smooth_array(points.xy, points.pen_up, points.times).tolist()
+            pen_up = points.pen_up
+            points = [None if pen_up[i] else tuple(p) for i, p in enumerate(smoothed)]
+        else:
+            points = DrawingEngine._smooth(points)
         if len(points) == 0:
             return
+        sx, sy, thickness = DrawingEngine._scale(img, world_size)
+        if world_size is not None:
+            points = [None if p is None else (int(p[0] * sx), int(p[1] * sy)) for p in points]
         for i in range(1, len(points)):
             if points[i - 1] is None or points[i] is None:
                 continue
-            DrawingEngine._draw_line(img, points[i-1], points[i], color)
+            DrawingEngine._draw_line(img, points[i-1], points[i], color, thickness)
 
     @staticmethod
     def _smooth(points):
-        size = 3
-        if len(points) < size:
-            return points
-        unzipped = list(zip(*points))
-        xs = list(unzipped[0])
-        ys = list(unzipped[1])
-        xs = pd.DataFrame(xs).rolling(size, min_periods=1).mean()
-        xs = np.array((xs[xs.columns[0]]))
-        ys = pd.DataFrame(ys).rolling(size, min_periods=1).mean()
-        ys = np.array((ys[ys.columns[0]]))
-        xs = xs.astype(int)
-        ys = ys.astype(int)
-
-        return list(zip(xs, ys))
+        return Smoothing.make_smoother().smooth(points)
 
 
     @staticmethod
@@ -59,5 +80,161 @@ class DrawingEngine:
         return np.zeros((img_hei, img_wid), np.uint8)
 
 
+class StrokeCanvas:
+    """
+    One player's drawing, kept between frames. Each call to draw only
+    smooths and rasterizes the points added since the last call, so the
+    cost per frame does not grow with the length of the stroke, and nothing
+    is drawn while the stroke's version has not changed. The canvas starts
+    over when its size changes or the points are cleared (a new round).
+    Draws the same image as DrawingEngine.draw.
+
+    After each call, dirty is the (x0, y0, x1, y1) region the call changed,
+    or None when nothing changed.
+    """
+    def __init__(self, color, binary=False, world_size=None):
+        """
+        :param color: BGR color of the strokes (ignored when binary)
+        :param binary: draw 255 on a single channel image instead
+        :param world_size: width of the world space the points are in, or None for pixels
+        """
+        self.color = 255 if binary else color
+        self.binary = binary
+        self.world_size = world_size
+        self.smoother = Smoothing.make_smoother()
+        self.reset()
+
+    def reset(self):
+        self.img = None
+        self._points = None
+        self._generation = None
+        self._version = None
+        self._count = 0
+        self._last = None
+        self._tail = None
+        self.dirty = None
+        self.smoother.reset()
+
+    def _to_image(self, point):
+        if point is None or self.world_size is None:
+            return point
+        return (int(point[0] * self._sx), int(point[1] * self._sy))
+
+    def _touch(self, x0, y0, x1, y1):
+        # Adds a region to dirty, clipped to the canvas
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, self.img.shape[1]), min(y1, self.img.shape[0])
+        if self.dirty is not None:
+            x0, y0 = min(x0, self.dirty[0]), min(y0, self.dirty[1])
+            x1, y1 = max(x1, self.dirty[2]), max(y1, self.dirty[3])
+        self.dirty = (x0, y0, x1, y1)
+
+    def _line(self, p1, p2):
+        pad = self._thickness
+        self._touch(min(p1[0], p2[0]) - pad, min(p1[1], p2[1]) - pad,
+                    max(p1[0], p2[0]) + pad + 1, max(p1[1], p2[1]) + pad + 1)
+        DrawingEngine._draw_line(self.img, p1, p2, self.color, self._thickness)
+
+    def draw(self, points, img_wid, img_hei):
+        """
+        :param points: every point drawn so far (list or StrokeBuffer). Points
+            are only ever appended until it is replaced or cleared, except for
+            the last point of a StrokeBuffer while it is provisional.
+        :return: the canvas. It is reused on the next call, do not draw on it.
+        """
+        version = getattr(points, "version", None)
+        if version is not None and version == self._version and points is self._points and \
+                self.img.shape[:2] == (img_hei, img_wid):
+            self.dirty = None
+            return self.img
+
+        self.dirty = None
+        if self._tail is not None:
+            x0, y0, patch = self._tail
+            self.img[y0:y0 + patch.shape[0], x0:x0 + patch.shape[1]] = patch
+            self._touch(x0, y0, x0 + patch.shape[1], y0 + patch.shape[0])
+            self._tail = None
+
+        generation = getattr(points, "generation", None)
+        if self.img is None or self.img.shape[:2] != (img_hei, img_wid) or \
+                points is not self._points or generation != self._generation or len(points) < self._count:
+            self.reset()
+            if self.binary:
+                self.img = DrawingEngine._blank_1_ch_img_of_size(img_wid, img_hei)
+            else:
+                self.img = DrawingEngine._blank_img_of_size(img_wid, img_hei)
+            self._sx, self._sy, self._thickness = DrawingEngine._scale(self.img, self.world_size)
+            self._points = points
+            self._generation = generation
+            self.dirty = (0, 0, img_wid, img_hei)
+
+        # A provisional last point can still move, so the segment to it is
+        #   taken back off the canvas on the next call and only kept once it is fixed
+        fixed = len(points) - 1 if getattr(points, "provisional", False) else len(points)
+        times = points.times if isinstance(points, StrokeBuffer) else None
+        for i in range(self._count, fixed):
+            point = self._to_image(self.smoother.push(points[i], None if times is None else float(times[i])))
+            if self._last is not None and point is not None:
+                self._line(self._last, point)
+            self._last = point
+        self._count = fixed
+        self._version = version
+
+        if fixed == len(points):
+            return self.img
+        tail = self.smoother.copy().push(points[fixed], None if times is None else float(times[fixed]))
+        tail = self._to_image(tail)
+        if self._last is not None and tail is not None:
+            # Save what is under the tail so the next call can take it back off
+            pad = self._thickness
+            x0, y0 = max(min(self._last[0], tail[0]) - pad, 0), max(min(self._last[1], tail[1]) - pad, 0)
+            x1, y1 = max(self._last[0], tail[0]) + pad + 1, max(self._last[1], tail[1]) + pad + 1
+            self._tail = (x0, y0, self.img[y0:y1, x0:x1].copy())
+            self._line(self._last, tail)
+        return self.img
+
+
+# Sizes kept by a StrokeRasterCache before the least recently used one is dropped
+RASTER_CACHE_ENTRIES = 8
+
+
+class StrokeRasterCache:
+    """
+    Rasterized strokes in world space, by (stroke key, size). Each size is
+    drawn once and then only updated when the stroke changes, so drawing the
+    same strokes for display and for evaluation, or after the playspace
+    changes size, does not draw them from scratch every frame.
+    """
+    def __init__(self, world_size=None, max_entries=RASTER_CACHE_ENTRIES):
+        """
+        :param world_size: width of the world space, defaults to Config.WORLD_SPACE_WIDTH
+        :param max_entries: canvases to keep
+        """
+        self.world_size = Config.WORLD_SPACE_WIDTH if world_size is None else world_size
+        self.max_entries = max_entries
+        self._canvases = collections.OrderedDict()
+
+    def get(self, key, stroke, size, color, binary=False):
+        """
+        :param key: what the stroke belongs to (ie: the player number)
+        :param stroke: StrokeBuffer in world space
+        :param size: width and height of the image
+        :param color: BGR color of the strokes
+        :param binary: single channel image with strokes at 255 (ie: for evaluation)
+        :return: the image. It is reused, do not draw on it.
+        """
+        cache_key = (key, size, binary)
+        canvas = self._canvases.pop(cache_key, None)
+        if canvas is None or canvas.color != (255 if binary else color):
+            canvas = StrokeCanvas(color, binary, self.world_size)
+        self._canvases[cache_key] = canvas
+        while len(self._canvases) > self.max_entries:
+            self._canvases.popitem(last=False)
+        return canvas.draw(stroke, size, size)
+
+    def clear(self):
+        self._canvases.clear()
+
+
 # Use this
 # display_all_img([DrawingEngine.draw([(0,0), (50,50)], 500, 500, (22, 33, 89))])
\ No newline at end of file
@@ -1,11 +1,15 @@
 import cv2
+import math
 import numpy as np
+import Config
 from DebugUtils import display_all_img
-from RoundGenerator import RoundGenerator
+from DrawingEngine import StrokeCanvas
 
 EVALUATION_SIZE_1 = (64, 64)
 EVALUATION_SIZE_2 = (32, 32)
 SCORE_MAX = 100
+# Spreads drawn pixels before the last downsampling, so lines near the target still count
+DILATE_KERNEL = cv2.getStructuringElement(cv2.MORPH_DILATE, (3, 3))
 
 class EvaluationEngine:
     harshness = 1.0
@@ -28,13 +32,15 @@ class EvaluationEngine:
         This compares two images, and returns the similarity
         as a number between 0 and 1.
 
-        :param target: the target image
+        :param target: the target image, or a RoundTarget
         :param drawing: the drawing image
         :return: value between 0 and 1 representing the similarity
         """
 
-        # pre-process each image
-        target_p = self._pre_process(target)
+        # pre-process each image, a RoundTarget's mask is already pre-processed
+        target_p = getattr(target, "mask", None)
+        if target_p is None:
+            target_p = self._pre_process(target)
         drawing_p = self._pre_process(drawing)
 
         # calculate the total number of pixels in target image
@@ -50,25 +56,71 @@ class EvaluationEngine:
         extra = cv2.subtract(drawing_p, target_p)
         extra_sum = np.sum(extra) / 255
 
+        # display_all_img([target, drawing, missing, extra])
+
+        return self._score(target_sum, correct_sum, extra_sum)
+
+    def _score(self, target_sum, correct_sum, extra_sum):
+        """
+        Works on numbers or on arrays of them.
+
+        :param target_sum: number of target pixels
+        :param correct_sum: number of drawn pixels on the target
+        :param extra_sum: number of drawn pixels off the target
+        :return: (accuracy between 0 and 1, score)
+        """
         # of pixels drawn, what ratio ([0,1]) were on target?
-        drawing_accuracy = correct_sum / max((correct_sum + extra_sum), 1)
+        drawing_accuracy = correct_sum / np.maximum((correct_sum + extra_sum), 1)
 
         # what percent ([0,1]) of the image was filled in?
-        image_completeness = correct_sum / max(target_sum, 1)
+        image_completeness = correct_sum / np.maximum(target_sum, 1)
 
         # final accuracy percent ([0,1])
         accuracy = image_completeness * drawing_accuracy
 
-        accuracy = max(min(accuracy - ((self.harshness - 1) * accuracy), 1.0), 0.0)
-
-        # display_all_img([target, drawing, missing, extra])
+        accuracy = np.clip(accuracy - ((self.harshness - 1) * accuracy), 0.0, 1.0)
 
         score = (SCORE_MAX * accuracy)
 
         return (accuracy, score)
 
+    def evaluate_batch(self, targets, drawings):
+        """
+        Compares every drawing with every target in one go.
 
-    def _pre_process(self, img):
+        :param targets: M target images or RoundTargets
+        :param drawings: N single channel drawing images, all the same size
+        :return: (accuracies, scores), both (N, M) arrays where [i, j]
+            compares drawing i with target j, the same as evaluate
+        """
+        # A RoundTarget's mask is already pre-processed
+        masks = [getattr(t, "mask", None) for t in targets]
+        target_bits = pack_masks([t if m is None else m for t, m in zip(targets, masks)],
+                                 pre_processed=[m is not None for m in masks])
+        return self.evaluate_packed(target_bits, pack_masks(drawings))
+
+    def evaluate_packed(self, target_bits, drawing_bits):
+        """
+        Same as evaluate_batch, for masks already packed with pack_masks
+        (ie: archived drawings scored again with another harshness).
+
+        :param target_bits: (M, words) packed target masks
+        :param drawing_bits: (N, words) packed drawing masks
+        :return: (accuracies, scores), both (N, M) arrays
+        """
+        target_sum = count_bits(target_bits)
+        correct_sum = np.empty((len(drawing_bits), len(target_bits)), np.int64)
+        drawn_sum = count_bits(drawing_bits)
+        # Drawings are compared in chunks so the intermediate array stays small
+        chunk = max(BATCH_WORDS // max(target_bits.size, 1), 1)
+        for start in range(0, len(drawing_bits), chunk):
+            both = drawing_bits[start:start + chunk, None, :] & target_bits[None, :, :]
+            correct_sum[start:start + chunk] = count_bits(both)
+        extra_sum = drawn_sum[:, None] - correct_sum
+        return self._score(target_sum[None, :], correct_sum, extra_sum)
+
+    @staticmethod
+    def _pre_process(img):
         """
         This pre-processes an image before comparing it. The images we
         compare in the end are only 16x16 binary images. By downsampling and
@@ -78,12 +130,137 @@ class EvaluationEngine:
         :return: the pre-processed image
         """
         pimg = cv2.resize(img, EVALUATION_SIZE_1)
-        pimg = cv2.dilate(pimg, cv2.getStructuringElement(cv2.MORPH_DILATE, (3, 3)))
+        pimg = cv2.dilate(pimg, DILATE_KERNEL)
         pimg = cv2.resize(pimg, EVALUATION_SIZE_2)
         pimg = cv2.threshold(pimg, 30, 255, cv2.THRESH_BINARY)[1]
 
         return pimg
 
 
+# Most 64 bit words evaluate_packed compares at once
+BATCH_WORDS = 1 << 20
+# Number of bits set in every byte
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], np.uint8)
+
+
+def pre_process_batch(images):
+    """
+    Runs EvaluationEngine._pre_process on many images.
+
+    :return: (n, height, width) bool array of EVALUATION_SIZE_2 masks
+    """
+    masks = np.zeros((len(images),) + EVALUATION_SIZE_2[::-1], np.bool_)
+    for i, img in enumerate(images):
+        np.greater(EvaluationEngine._pre_process(img), 0, out=masks[i])
+    return masks
+
+
+def pack_masks(images, pre_processed=False):
+    """
+    :param images: images to pre-process, or masks already pre-processed
+    :param pre_processed: True (or one flag per image) for masks that are already pre-processed
+    :return: (n, words) uint64 array, each row holding one mask's cells as bits
+    """
+    flags = np.broadcast_to(pre_processed, (len(images),))
+    masks = np.zeros((len(images),) + EVALUATION_SIZE_2[::-1], np.bool_)
+    if flags.any():
+        masks[flags] = [np.asarray(images[i]) > 0 for i in np.flatnonzero(flags)]
+    if not flags.all():
+        rest = np.flatnonzero(~flags)
+        masks[rest] = pre_process_batch([images[i] for i in rest])
+    bits = np.packbits(masks.reshape(len(images), -1), axis=1)
+    # Pad rows to whole 64 bit words
+    bits = np.pad(bits, ((0, 0), (0, -bits.shape[1] % 8)))
+    return bits.view(np.uint64)
+
+
+def count_bits(bits):
+    """
+    :param bits: uint64 array
+    :return: number of bits set along the last axis
+    """
+    counts = POPCOUNT[bits.view(np.uint8)]
+    return counts.reshape(bits.shape[:-1] + (-1,)).sum(axis=-1, dtype=np.int64)
+
+
+class LiveEvaluator:
+    """
+    Scores one player's drawing while it is being drawn, with the same
+    result as evaluate. The strokes are drawn at world size and the counts
+    of correct and extra cells are kept between frames. Each update only
+    runs _pre_process on the tiles of the drawing the new segments touched,
+    so it costs time in proportion to the new ink, not to the drawing.
+
+    Tiles are as big as possible while their corners still fall on pixels
+    of both EVALUATION_SIZE_1 and EVALUATION_SIZE_2, so resizing a tile
+    gives exactly the pixels of resizing the whole drawing.
+    """
+    def __init__(self, engine, target, world_size=None):
+        """
+        :param engine: EvaluationEngine whose harshness is used
+        :param target: the target image, or a RoundTarget
+        :param world_size: width of the world space, defaults to Config.WORLD_SPACE_WIDTH
+        """
+        self.engine = engine
+        target_p = getattr(target, "mask", None)
+        if target_p is None:
+            target_p = engine._pre_process(target)
+        self.target = target_p > 0
+        self.target_sum = int(np.count_nonzero(self.target))
+        self.world_size = Config.WORLD_SPACE_WIDTH if world_size is None else world_size
+        self.canvas = StrokeCanvas(None, binary=True, world_size=self.world_size)
+
+        # Tiles per side: the most that divide both sizes into whole pixels,
+        #   with an even number of EVALUATION_SIZE_1 pixels per tile
+        size = EVALUATION_SIZE_1[0]
+        tiles = math.gcd(self.world_size, size // 2)
+        self._tile = self.world_size // tiles
+        self._tile_pixels = size // tiles
+        self.reset()
+
+    def reset(self):
+        self.canvas.reset()
+        self.fine = np.zeros(EVALUATION_SIZE_1[::-1], np.uint8)
+        self.cells = np.zeros(self.target.shape, np.bool_)
+        self.correct_sum = 0
+        self.extra_sum = 0
+
+    def update(self, stroke):
+        """
+        :param stroke: the player's StrokeBuffer, in world space
+        :return: (accuracy between 0 and 1, score) of the drawing so far
+        """
+        img = self.canvas.draw(stroke, self.world_size, self.world_size)
+        if self.canvas.dirty is not None:
+            self._recount(img, self.canvas.dirty)
+        return self.engine._score(self.target_sum, self.correct_sum, self.extra_sum)
+
+    def _recount(self, img, dirty):
+        # Resize the tiles the dirty region touches
+        x0, y0, x1, y1 = dirty
+        tile, pixels = self._tile, self._tile_pixels
+        tx0, ty0 = x0 // tile, y0 // tile
+        tx1, ty1 = -(-x1 // tile), -(-y1 // tile)
+        fx0, fy0, fx1, fy1 = tx0 * pixels, ty0 * pixels, tx1 * pixels, ty1 * pixels
+        self.fine[fy0:fy1, fx0:fx1] = cv2.resize(img[ty0 * tile:ty1 * tile, tx0 * tile:tx1 * tile],
+                                                 (fx1 - fx0, fy1 - fy0))
+
+        # Dilation spreads the changed pixels by one, into the cells around them
+        rows, cols = self.cells.shape
+        c0, r0 = max(fx0 - 1, 0) // 2, max(fy0 - 1, 0) // 2
+        c1, r1 = min(-(-(fx1 + 1) // 2), cols), min(-(-(fy1 + 1) // 2), rows)
+        px0, py0 = max(2 * c0 - 1, 0), max(2 * r0 - 1, 0)
+        dilated = cv2.dilate(self.fine[py0:2 * r1 + 1, px0:2 * c1 + 1], DILATE_KERNEL)
+        dilated = dilated[2 * r0 - py0:2 * r1 - py0, 2 * c0 - px0:2 * c1 - px0]
+        cells = cv2.resize(dilated, (c1 - c0, r1 - r0)) > 30
+
+        target = self.target[r0:r1, c0:c1]
+        old = self.cells[r0:r1, c0:c1]
+        self.correct_sum += int(np.count_nonzero(cells & target)) - int(np.count_nonzero(old & target))
+        self.extra_sum += int(np.count_nonzero(cells & ~target)) - int(np.count_nonzero(old & ~target))
+        self.cells[r0:r1, c0:c1] = cells
+
+
+# from RoundGenerator import RoundGenerator
 # e = EvaluationEngine(0.7)
 # e.evaluate(RoundGenerator.get_round(3)[0], RoundGenerator.get_round(4)[0], 5, 5)
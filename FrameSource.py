@@ -0,0 +1,141 @@
+import os
+import time
+import cv2
+
+# Frame rate used to pace image directories when not playing as fast as possible
+IMAGE_DIRECTORY_FPS = 30
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class CameraSource:
+    """
+    A live camera. Frames come as fast as the camera produces them.
+    """
+    live = True
+
+    def __init__(self, index, resolution=None):
+        """
+        :param index: OpenCV camera index
+        :param resolution: (width, height) to request from the camera
+        """
+        self.name = "camera {}".format(index)
+        self.cap = cv2.VideoCapture(index)
+        # uvcdynctrl -f
+        if resolution is not None:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, resolution[0])
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, resolution[1])
+
+    def read(self):
+        return self.cap.read()
+
+    def release(self):
+        self.cap.release()
+
+
+class _PacedSource:
+    """
+    Base for recorded sources. Unless fast is set, read() sleeps so frames
+    come at the recorded frame rate, like they would from a camera.
+    """
+    live = False
+
+    def __init__(self, fps, fast):
+        self.frame_time = 1.0 / fps if fps and fps > 0 else 0
+        self.fast = fast
+        self._next_time = None
+
+    def _pace(self):
+        if self.fast or self.frame_time == 0:
+            return
+        now = time.monotonic()
+        if self._next_time is not None and now < self._next_time:
+            time.sleep(self._next_time - now)
+            now = self._next_time
+        self._next_time = now + self.frame_time
+
+
+class VideoFileSource(_PacedSource):
+    """
+    A recorded video file.
+    """
+
+    def __init__(self, path, fast=False, loop=False):
+        """
+        :param path: video file to play
+        :param fast: play as fast as frames can be decoded
+        :param loop: start over at the end of the video instead of ending
+        """
+        self.name = path
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise ValueError("Could not open video file: %s" % path)
+        self.loop = loop
+        super().__init__(self.cap.get(cv2.CAP_PROP_FPS), fast)
+
+    def read(self):
+        self._pace()
+        ret, frame = self.cap.read()
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        return ret, frame
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageDirectorySource(_PacedSource):
+    """
+    A directory of still images (ie: images/on), played in file name order.
+    """
+
+    def __init__(self, path, fast=False, loop=False, fps=IMAGE_DIRECTORY_FPS):
+        """
+        :param path: directory of images, or a single image file
+        :param fast: play as fast as images can be decoded
+        :param loop: start over after the last image instead of ending
+        :param fps: frame rate to play at when not fast
+        """
+        self.name = path
+        if os.path.isdir(path):
+            self.files = sorted(os.path.join(path, f) for f in os.listdir(path)
+                                if f.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            self.files = [path]
+        if len(self.files) == 0:
+            raise ValueError("No images found in: %s" % path)
+        self.loop = loop
+        self.index = 0
+        super().__init__(fps, fast)
+
+    def read(self):
+        self._pace()
+        if self.index >= len(self.files):
+            if not self.loop:
+                return False, None
+            self.index = 0
+        frame = cv2.imread(self.files[self.index])
+        self.index += 1
+        return frame is not None, frame
+
+    def release(self):
+        pass
+
+
+def open_source(source, resolution=None, fast=False, loop=False):
+    """
+    Opens a frame source. Every source has read() and release() like
+    cv2.VideoCapture, and a `live` flag.
+
+    :param source: camera index, video file, image file or directory of images
+    :param resolution: (width, height) to request from a camera
+    :param fast: play recorded sources as fast as possible instead of in real time
+    :param loop: restart recorded sources when they end
+    :return: the frame source
+    """
+    if isinstance(source, int) or str(source).isdigit():
+        return CameraSource(int(source), resolution)
+    if os.path.isdir(source) or source.lower().endswith(IMAGE_EXTENSIONS):
+        return ImageDirectorySource(source, fast, loop)
+    return VideoFileSource(source, fast, loop)
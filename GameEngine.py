@@ -1,57 +1,110 @@
 import cv2
+import json
 import time
 import Config
 import States
 import UI
 import Utility
 from RoundGenerator import RoundGenerator
-from DrawingEngine import DrawingEngine
-from EvaluationEngine import EvaluationEngine
+from DrawingEngine import StrokeRasterCache
+from EvaluationEngine import EvaluationEngine, LiveEvaluator
 from Player import Player
 from DebugUtils import display_all_img
+from Capture import ThreadedCapture
+import FrameSource
+from DetectionPool import DetectionPool
+from MultiCamera import MultiCamera
 import VidProcessor
 
 class GameEngine:
-    def __init__(self, camera):
-        self.camera = camera
+    def __init__(self, source, headless=False, fast=False):
+        """
+        :param source: camera index, video file or directory of images (see FrameSource.open_source),
+            or a list of them to use one camera per player
+        :param headless: run without any windows or keyboard input. Rounds start on their own
+            and the game stops after the last round.
+        :param fast: play recorded sources as fast as possible
+        """
+        self.source = source
+        self.headless = headless
+        self.fast = fast
         self.state = States.IDLE
         self.prev_state = States.IDLE
 
         self.round = 1
         self.target = None
         self.round_max_time = 0
+        # Each player's score while the round is played
+        self.live = []
+        # (round number, Future) of the round loading in the background
+        self.prefetched = None
 
         self.round_start_time = time.time()
         self.countdown_start_time = time.time()
         self.post_round_start_time = time.time()
 
-        self.p1 = Player()
-        self.p2 = Player()
+        if Config.NUM_PLAYERS > len(Utility.COLOR_ORDER):
+            raise ValueError("{} players need {} colors in Utility.COLOR_ORDER, there are only {}".format(
+                Config.NUM_PLAYERS, Config.NUM_PLAYERS, len(Utility.COLOR_ORDER)))
+        if isinstance(source, (list, tuple)) and len(source) != Config.NUM_PLAYERS:
+            raise ValueError("Multi-camera mode needs one camera per player: {} cameras for {} players".format(
+                len(source), Config.NUM_PLAYERS))
+        self.players = [Player() for _ in range(Config.NUM_PLAYERS)]
+        # Each player's drawing at every size it is shown or scored at
+        self.rasters = StrokeRasterCache()
 
         self.evaluation_engine = EvaluationEngine(0.7)
+        # Round targets come preprocessed from the asset pack when it has been built
+        RoundGenerator.load_assets()
+
+        self.tracker = VidProcessor.WandTracker()
+        self.motion_gate = VidProcessor.MotionGate()
+        self.detection_pool = None
 
     def run_engine(self):
         self.state = States.PRE_ROUND
 
         # Grabs the window name from the config
-        cv2.namedWindow(Config.WINDOW_NAME, cv2.WINDOW_NORMAL)
+        if not self.headless:
+            cv2.namedWindow(Config.WINDOW_NAME, cv2.WINDOW_NORMAL)
 
-        cap = cv2.VideoCapture(self.camera)
-        # uvcdynctrl -f
         res = [(800, 600), (1280, 720)]
         chosen = res[0]
-        cap.set(3, chosen[0])  # Width
-        cap.set(4, chosen[1])  # Height
+        if isinstance(self.source, (list, tuple)):
+            # Every camera captures, flips and detects on its own thread
+            cap = MultiCamera([FrameSource.open_source(s, resolution=chosen, fast=self.fast, loop=True)
+                               for s in self.source]).start()
+        else:
+            cap = FrameSource.open_source(self.source, resolution=chosen, fast=self.fast, loop=True)
+            # Recorded sources are read in the loop so no frame is skipped
+            if Config.THREADED_CAPTURE and cap.live:
+                cap = ThreadedCapture(cap).start()
+            if Config.DETECTION_WORKERS > 0:
+                self.detection_pool = DetectionPool(Config.DETECTION_WORKERS)
+        self.prefetch_round(self.round)
+        frames = 0
+        start_time = time.time()
         while True:
             ret, frame = cap.read()
-            if Config.FLIP_IMAGE:
+            if not ret:
+                print("ERROR: Could not read a frame from {}.".format(self.source))
+                break
+            frames += 1
+            if isinstance(cap, MultiCamera):
+                # Cameras flip their own frames. Only detections made while playing are used.
+                if self.state != States.PLAYING_ROUND:
+                    cap.discard()
+            elif self.detection_pool is not None:
+                # Publishing flips the frame and copies it into the workers' shared memory
+                frame = self.detection_pool.publish(frame, Config.FLIP_IMAGE)
+            elif Config.FLIP_IMAGE:
                 frame = cv2.flip(frame, 1)
 
             # Display different UIs for different game states
             if self.state == States.PRE_ROUND:
                 # If this is the first loop where the state is PRE_ROUND, create a new target
                 if self.state_changed():
-                    round = RoundGenerator.get_round(self.round)
+                    round = self.take_round(self.round)
                     self.target = round[0]
                     self.round_max_time = round[1]
 
@@ -61,8 +114,8 @@ class GameEngine:
 
                 # Wait for a player to press the space bar
                 # TODO: For some reason this is not immediately responsive. Anyone can feel free to solve this problem.
-                key = cv2.waitKey(1)
-                if key == ord(' ') or key == 32:
+                key = self.wait_key()
+                if self.headless or key == ord(' ') or key == 32:
                     self.state = States.COUNTDOWN
 
             elif self.state == States.COUNTDOWN:
@@ -88,50 +141,58 @@ class GameEngine:
                 if self.state_changed():
                     print("PLAYING ROUND")
                     self.round_start_time = time.time()
+                    self.live = [LiveEvaluator(self.evaluation_engine, self.target) for _ in self.players]
 
                 # Get the playable space such that each sub component knows the player's draw space
                 ps = Utility.playable_space(frame)
 
-                # TODO: This is where I would call VidProcessor for the list of points
-                p1_world_coord = VidProcessor.get_coords(frame, ps, Config.PLAYER_ONE) # Player 1
-                p2_world_coord = VidProcessor.get_coords(frame, ps, Config.PLAYER_TWO) # Player 2
+                # Load the next round while this one is played
+                if self.prefetched is None and self.round < Config.NUM_ROUNDS:
+                    self.prefetch_round(self.round + 1, ps)
 
-                # Add the new drawing coordinates to each player
-                self.p1.update_coord(p1_world_coord, self.round_start_time)
-                self.p2.update_coord(p2_world_coord, self.round_start_time)
+                # Find every player's wand and add the new drawing coordinates to each player
+                self.update_players(frame, ps, cap)
 
                 # Get the current round's time
                 round_time = self.round_max_time - Utility.get_elapsed_time(self.round_start_time)
 
-                p1_drawing = DrawingEngine.draw(self.p1.world_coords, ps.get("side"), ps.get("side"),
-                                                Utility.PRIMARY_COLORS[Utility.COLOR_ORDER[Config.PLAYER_ONE]])
-                p2_drawing = DrawingEngine.draw(self.p2.world_coords, ps.get("side"), ps.get("side"),
-                                                Utility.PRIMARY_COLORS[Utility.COLOR_ORDER[Config.PLAYER_TWO]])
+                drawings = self.draw_players(ps)
 
-                print("p1 points: {}".format(len(self.p1.world_coords)))
+                # Only the cells around each player's new ink are scored again
+                accuracies = [live.update(player.world_coords)[0] for live, player in zip(self.live, self.players)]
+
+                print("p1 points: {}".format(len(self.players[Config.PLAYER_ONE].world_coords)))
 
 
                 if round_time > 0:
-                    # We pass pixel coordinates because it will be quicker than to converting from world coordinates
-                    frame = UI.playing_round(frame, ps, self.round, round_time, self.target,
-                                             p1_drawing, p2_drawing)
+                    frame = UI.playing_round(frame, ps, self.round, round_time, self.target, drawings, accuracies)
                 else:
-                    frame = UI.playing_round(frame, ps, self.round, 0, self.target,
-                                             p1_drawing, p2_drawing)
+                    frame = UI.playing_round(frame, ps, self.round, 0, self.target, drawings, accuracies)
 
-                    self.p1.round_over()
-                    self.p2.round_over()
+                    for player in self.players:
+                        player.round_over()
 
                     # Change the game state
                     self.state = States.POST_ROUND
 
             elif self.state == States.POST_ROUND:
                 # If this is the first loop where the state is POST_ROUND, set the start_time to the current time
-                print("p1 draw time: {}".format(self.p1.draw_time))
-                print("p2 draw time: {}".format(self.p2.draw_time))
+                for i, player in enumerate(self.players):
+                    print("p{} draw time: {}".format(i + 1, player.draw_time))
                 if self.state_changed():
                     print("POST ROUND")
                     self.post_round_start_time = time.time()
+                    if isinstance(cap, MultiCamera):
+                        print(cap.report())
+                    else:
+                        if Config.WAND_TRACKER:
+                            print(self.tracker.report())
+                            self.tracker.reset_stats()
+                        if Config.MOTION_GATE:
+                            print(self.motion_gate.report())
+                            self.motion_gate.reset()
+                        if isinstance(cap, ThreadedCapture):
+                            print(cap.report())
 
                 # Get the countdown to the next round/end of game
                 post_round_time = Config.POST_ROUND_DURATION - Utility.get_elapsed_time(self.post_round_start_time)
@@ -139,40 +200,32 @@ class GameEngine:
                 # Get the playable space such that each sub component knows the player's draw space
                 ps = Utility.playable_space(frame)
 
-                p1_drawing = DrawingEngine.draw(self.p1.world_coords, ps.get("side"), ps.get("side"),
-                                Utility.PRIMARY_COLORS[Utility.COLOR_ORDER[Config.PLAYER_ONE]])
-                p2_drawing = DrawingEngine.draw(self.p2.world_coords, ps.get("side"), ps.get("side"),
-                                                Utility.PRIMARY_COLORS[Utility.COLOR_ORDER[Config.PLAYER_TWO]])
-
-                p1_drawing_binary = cv2.cvtColor(p1_drawing, cv2.COLOR_BGR2GRAY)
-                p2_drawing_binary = cv2.cvtColor(p2_drawing, cv2.COLOR_BGR2GRAY)
-                p1_drawing_binary = cv2.threshold(p1_drawing_binary, 30, 255, cv2.THRESH_BINARY)[1]
-                p2_drawing_binary = cv2.threshold(p2_drawing_binary, 30, 255, cv2.THRESH_BINARY)[1]
-
-                if self.p1.round_score is None:
-                    # TODO: convert p1 world coordinates to world size image before passing to evaluate
-                    evaluation = self.evaluation_engine.evaluate(self.target, p1_drawing_binary, self.round_max_time, self.p1.draw_time)
-                    self.p1.round_score = evaluation[1]
-                    self.p1.round_accuracy = evaluation[0]
-                    print("P1 Score: {}".format(self.p1.round_score))
-                if self.p2.round_score is None:
-                    # TODO: convert p2 world coordinates to world size image before passing to evaluate
-                    evaluation = self.evaluation_engine.evaluate(self.target, p2_drawing_binary, self.round_max_time, self.p2.draw_time)
-                    self.p2.round_score = evaluation[1]
-                    self.p2.round_accuracy = evaluation[0]
-                    print("P2 Score: {}".format(self.p2.round_score))
+                drawings = self.draw_players(ps)
 
+                if any(player.round_score is None for player in self.players):
+                    # Score every player's strokes at once, drawn at world size like the target
+                    drawings_binary = [self.rasters.get(i, player.world_coords, Config.WORLD_SPACE_WIDTH, None, binary=True)
+                                       for i, player in enumerate(self.players)]
+                    accuracies, scores = self.evaluation_engine.evaluate_batch([self.target], drawings_binary)
+                    for i, player in enumerate(self.players):
+                        player.round_score = float(scores[i, 0])
+                        player.round_accuracy = float(accuracies[i, 0])
+                        print("P{} Score: {}".format(i + 1, player.round_score))
+
+                scores = [p.round_score for p in self.players]
+                accuracies = [p.round_accuracy for p in self.players]
                 if post_round_time > 0:
-                    frame = UI.post_round(frame, post_round_time, self.p1.round_score, self.p2.round_score,
-                                          self.p1.round_accuracy, self.p2.round_accuracy, ps, self.target, p1_drawing, p2_drawing)
+                    frame = UI.post_round(frame, post_round_time, scores, accuracies, ps, self.target, drawings)
                 else:
                     # Save the current round's score to each player's total score
-                    frame = UI.post_round(frame, 0, self.p1.round_score, self.p2.round_score,
-                                          self.p1.round_accuracy, self.p2.round_accuracy, ps, self.target, p1_drawing, p2_drawing)
+                    frame = UI.post_round(frame, 0, scores, accuracies, ps, self.target, drawings)
+
+                    if Config.STROKE_CORPUS:
+                        self.record_strokes(Config.STROKE_CORPUS)
 
                     # Saves round score
-                    self.p1.save_round()
-                    self.p2.save_round()
+                    for player in self.players:
+                        player.save_round()
 
                     if self.round < Config.NUM_ROUNDS:
                         # Goes to the next round
@@ -185,27 +238,114 @@ class GameEngine:
             elif self.state == States.END_GAME:
                 if self.state_changed():
                     print("End Game")
-                    print("P1 Final Score: {}".format(self.p1.total_score))
-                    print("P2 Final Score: {}".format(self.p2.total_score))
+                    for i, player in enumerate(self.players):
+                        print("P{} Final Score: {}".format(i + 1, player.total_score))
                     print("Press 'r' to play again or press 'q' to quit.")
 
-                frame = UI.end_game(frame, self.p1.total_score, self.p2.total_score)
+                frame = UI.end_game(frame, [p.total_score for p in self.players])
 
-                key = cv2.waitKey(1)
+                if self.headless:
+                    break
+
+                key = self.wait_key()
                 if key == ord('r') or key == 82:
                     cap.release()
-                    self.__init__(self.camera)
+                    self.close_detection_pool()
+                    self.__init__(self.source, self.headless, self.fast)
                     self.run_engine()
+                    return
 
             else:
                 print("ERROR: There is no state {}.".format(self.state))
                 break
 
-            cv2.imshow(Config.WINDOW_NAME, frame)
-            key = cv2.waitKey(1)
+            if not self.headless:
+                cv2.imshow(Config.WINDOW_NAME, frame)
+            key = self.wait_key()
             if key == ord('q') or key == 27:
                 break
 
+        elapsed = Utility.get_elapsed_time(start_time)
+        print("Processed {} frames in {:.1f}s ({:.1f} fps)".format(frames, elapsed, frames / max(elapsed, 1e-6)))
+        if isinstance(cap, MultiCamera):
+            print(cap.report())
+        cap.release()
+        self.close_detection_pool()
+
+    # Returns the key pressed, or -1 when headless since there is no window to take input
+    def wait_key(self):
+        if self.headless:
+            return -1
+        return cv2.waitKey(1)
+
+    # Starts loading a round's target in the background, with its overlay at the playspace size
+    def prefetch_round(self, round_number, ps=None):
+        sides = [ps["side"]] if ps is not None else []
+        self.prefetched = (round_number, RoundGenerator.prefetch(round_number, sides))
+
+    # Returns the round started by prefetch_round, waiting for it if it is still loading
+    def take_round(self, round_number):
+        if self.prefetched is not None and self.prefetched[0] == round_number:
+            round = self.prefetched[1].result()
+        else:
+            round = RoundGenerator.get_round(round_number)
+        self.prefetched = None
+        return round
+
+    # Appends every player's strokes this round to a JSON lines corpus
+    def record_strokes(self, path):
+        with open(path, "a") as f:
+            for i, player in enumerate(self.players):
+                record = {"target": self.target.name, "round": self.round, "player": i + 1,
+                          "score": player.round_score}
+                record.update(player.world_coords.to_json())
+                f.write(json.dumps(record) + "\n")
+
+    # Draws every player's strokes, in their color, the size of their playspace
+    def draw_players(self, ps):
+        return [self.rasters.get(i, player.world_coords, ps.get("side"),
+                                 Utility.PRIMARY_COLORS[Utility.COLOR_ORDER[i]])
+                for i, player in enumerate(self.players)]
+
+    # Finds every player's wand and adds it to their drawing
+    def update_players(self, frame, ps, cap):
+        if isinstance(cap, MultiCamera):
+            # Detections come merged from every camera, in the order they were captured
+            for player_num, world_coord, timestamp in cap.get_all_coords():
+                if timestamp >= self.round_start_time:
+                    self.players[player_num].update_coord(world_coord, self.round_start_time, timestamp)
+            return
+
+        coords = self.find_wands(frame, ps)
+        for player, pixel_coord in zip(self.players, coords):
+            player.update_coord(Utility.to_world(pixel_coord, ps["side"]), self.round_start_time)
+
+    # Finds every player's wand with the detection modes turned on in Config
+    def find_wands(self, frame, ps):
+        players = self.players
+        if self.detection_pool is not None:
+            return self.detection_pool.get_all_coords(frame, ps)
+
+        # The tracker and motion gate paths share the frame's label map like
+        #   VidProcessor.get_all_coords does, so no playspace is classified twice
+        labels = VidProcessor.FrameLabels.for_frame(frame, ps)
+
+        def detect(player_num):
+            if Config.WAND_TRACKER:
+                return self.tracker.get_coords(frame, ps, player_num, players[player_num], labels)
+            return VidProcessor.get_coords(frame, ps, player_num, labels)
+
+        if Config.MOTION_GATE:
+            return self.motion_gate.get_all_coords(frame, ps, detect)
+        if Config.WAND_TRACKER:
+            return self.tracker.get_all_coords(frame, ps, players)
+        return VidProcessor.get_all_coords(frame, ps)
+
+    def close_detection_pool(self):
+        if self.detection_pool is not None:
+            self.detection_pool.close()
+            self.detection_pool = None
+
     def state_changed(self):
         if self.state != self.prev_state:
             self.prev_state = self.state
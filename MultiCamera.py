@@ -0,0 +1,211 @@
+import collections
+import threading
+import time
+import cv2
+import numpy as np
+
+import Config
+import Utility as util
+import VidProcessor
+
+# A wand detection from one camera. coord is in pixels of that camera's
+#   square playspace, which is side pixels wide. timestamp is when the frame
+#   was captured, on the wall clock (time.time()) after clock alignment.
+Detection = collections.namedtuple("Detection", ["camera", "player_num", "coord", "side", "timestamp"])
+
+# Detections held back waiting for slower cameras are released once they
+#   are this many seconds old, so a stalled camera cannot stall the game
+MERGE_WINDOW = 0.1
+
+# Seconds of frames used for each camera's frame rate
+FPS_WINDOW = 2.0
+
+
+class CameraWorker:
+    """
+    Captures and detects one player's wand on its own thread. Every frame is
+    flipped, cropped to a single square playspace and searched for the
+    player's wand color, and the result is queued as a Detection. OpenCV and
+    NumPy release the GIL while they work, so cameras run in parallel.
+    """
+
+    def __init__(self, camera, source, player_num, offset=0.0):
+        """
+        :param camera: index of this camera in the MultiCamera
+        :param source: frame source (see FrameSource.open_source)
+        :param player_num: player whose wand this camera looks for
+        :param offset: seconds this camera's frames arrive after they are
+            captured. Subtracted from every timestamp to line cameras up.
+        """
+        self.camera = camera
+        self.source = source
+        self.player_num = player_num
+        self.offset = offset
+        self.motion_gate = VidProcessor.MotionGate() if Config.MOTION_GATE else None
+
+        self._lock = threading.Lock()
+        self._detections = collections.deque()
+        self._frame = None
+        self.frame_shape = None
+        self._thread = None
+        self._running = False
+        self.finished = False
+        self.latest_timestamp = None
+
+        self.frames = 0
+        self._frame_times = collections.deque()
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="camera %d" % self.camera, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        # time.monotonic() does not jump, so convert to the wall clock with a
+        #   single offset taken at startup
+        wall_offset = time.time() - time.monotonic()
+        coord = None
+        while self._running:
+            ret, frame = self.source.read()
+            captured = time.monotonic()
+            if not ret:
+                break
+            if Config.FLIP_IMAGE:
+                frame = cv2.flip(frame, 1)
+
+            ps = util.playable_space(frame, 1)
+            cropped = util.crop_playspace(frame, ps, 0)
+            if self.motion_gate is None or not self.motion_gate.is_static(0, cropped):
+                coord = VidProcessor.find_wand_bgr(cropped, self.player_num)
+
+            timestamp = captured + wall_offset - self.offset
+            with self._lock:
+                self._frame = cropped
+                self.frame_shape = frame.shape
+                self._detections.append(Detection(self.camera, self.player_num, coord, ps["side"], timestamp))
+                self.latest_timestamp = timestamp
+                self.frames += 1
+                self._frame_times.append(captured)
+                while captured - self._frame_times[0] > FPS_WINDOW:
+                    self._frame_times.popleft()
+        self.finished = True
+
+    def take(self):
+        """
+        :return: every detection since the last call, oldest first, and the newest cropped frame
+        """
+        with self._lock:
+            detections = list(self._detections)
+            self._detections.clear()
+            return detections, self._frame
+
+    def fps(self):
+        with self._lock:
+            if len(self._frame_times) < 2:
+                return 0.0
+            return (len(self._frame_times) - 1) / max(self._frame_times[-1] - self._frame_times[0], 1e-6)
+
+    def release(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.source.release()
+
+
+class MultiCamera:
+    """
+    One camera per player. Each camera runs its own CameraWorker and the
+    detections are merged into a single stream in capture time order.
+
+    read() returns a frame for the UI with each camera's playspace scaled
+    into that player's cell of the normal playspace grid, so the rest of the
+    game draws on it as if it came from a single camera.
+    """
+
+    def __init__(self, sources, offsets=None):
+        """
+        :param sources: frame sources, one per player in player order
+        :param offsets: seconds of extra latency of each camera (defaults to
+            Config.CAMERA_OFFSETS)
+        """
+        if offsets is None:
+            offsets = Config.CAMERA_OFFSETS
+        self.workers = [CameraWorker(i, source, i, offsets[i] if i < len(offsets) else 0.0)
+                        for i, source in enumerate(sources)]
+        self.live = all(source.live for source in sources)
+        self._pending = []
+        self._frames = [None] * len(self.workers)
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+        return self
+
+    def read(self):
+        """
+        Waits for every camera's first frame, then returns right away.
+
+        :return: (ret, frame) like cv2.VideoCapture.read(). The frame is the
+            size of the first camera's. ret is False once every camera has ended.
+        """
+        while True:
+            for i, worker in enumerate(self.workers):
+                detections, frame = worker.take()
+                self._pending.extend(detections)
+                if frame is not None:
+                    self._frames[i] = frame
+            finished = all(worker.finished for worker in self.workers)
+            if finished and not self._pending:
+                return False, None
+            if all(frame is not None for frame in self._frames):
+                break
+            if finished:
+                return False, None
+            time.sleep(0.001)
+
+        canvas = np.zeros(self.workers[0].frame_shape, np.uint8)
+        ps = util.playable_space(canvas, len(self.workers))
+        for i, frame in enumerate(self._frames):
+            tl, br = ps["spaces"][i]
+            canvas[tl[1]:br[1], tl[0]:br[0]] = cv2.resize(frame, (ps["side"], ps["side"]))
+        return True, canvas
+
+    def get_all_coords(self):
+        """
+        Merges the detections of every camera in capture time order. A
+        detection is only handed out once every running camera has captured
+        a frame at least as new (or it is older than MERGE_WINDOW), so
+        detections from a faster camera never jump ahead of a slower one.
+
+        :return: list of (player_num, world_coord, timestamp), oldest first
+        """
+        running = [w.latest_timestamp for w in self.workers if not w.finished and w.latest_timestamp is not None]
+        watermark = min(running) if running else float("inf")
+        cutoff = max(watermark, time.time() - MERGE_WINDOW)
+
+        self._pending.sort(key=lambda d: d.timestamp)
+        ready = [d for d in self._pending if d.timestamp <= cutoff]
+        self._pending = self._pending[len(ready):]
+
+        return [(d.player_num, util.to_world(d.coord, d.side), d.timestamp) for d in ready]
+
+    def discard(self):
+        """
+        Drops every detection not handed out yet.
+        """
+        self._pending = []
+
+    def release(self):
+        for worker in self.workers:
+            worker.release()
+
+    def report(self):
+        cameras = []
+        for w in self.workers:
+            camera = "%s %d frames (%.1f fps" % (w.source.name, w.frames, w.fps())
+            if w.motion_gate is not None:
+                camera += ", %.0f%% skipped" % (w.motion_gate.skip_rate(0) * 100)
+            cameras.append(camera + ")")
+        return "cameras: " + ", ".join(cameras) + ", %.1f fps total" % sum(w.fps() for w in self.workers)
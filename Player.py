@@ -1,11 +1,17 @@
 import Config
 import Utility
 import time
+from StrokeBuffer import StrokeBuffer
+from Simplify import StrokeSimplifier
 
 
 class Player:
+    __slots__ = ("world_coords", "simplifier", "is_drawing", "last_draw_time", "draw_time",
+                 "round_score", "round_accuracy", "total_score")
+
     def __init__(self):
-        self.world_coords = []
+        self.world_coords = StrokeBuffer()
+        self.simplifier = StrokeSimplifier() if Config.SIMPLIFY_STROKES else None
         self.is_drawing = False
         self.last_draw_time = time.time()
         self.draw_time = 0
@@ -13,13 +19,16 @@ class Player:
         self.round_accuracy = None
         self.total_score = 0
 
-    # Add world coordinates to their respective arrays
-    def update_coord(self, world_coord, round_start_time):
-        time_since_last_draw = Utility.get_elapsed_time(self.last_draw_time)
+    # Add world coordinates to their respective arrays. timestamp is when the
+    #   coordinate was captured (time.time()), defaults to now
+    def update_coord(self, world_coord, round_start_time, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        time_since_last_draw = Utility.get_elapsed_time(self.last_draw_time, timestamp)
         if world_coord is None and self.is_drawing and time_since_last_draw >= Config.DRAW_TIMEOUT:
             # Take the amount of time it took the player to draw their image
             self.is_drawing = False
-            self.draw_time = Utility.get_elapsed_time(round_start_time)
+            self.draw_time = Utility.get_elapsed_time(round_start_time, timestamp)
         elif world_coord is not None:
             # If the player was not drawing before, clear their drawing coordinates
             #if not self.is_drawing:
@@ -27,12 +36,17 @@ class Player:
             self.is_drawing = True
 
             # Add the new point to the player's coordinates
-            self.world_coords.append(world_coord)
-            self.last_draw_time = time.time()
+            if self.simplifier is not None:
+                self.simplifier.add(self.world_coords, world_coord, timestamp)
+            else:
+                self.world_coords.append(world_coord, timestamp)
+            self.last_draw_time = timestamp
 
     # clear the coordinates of the player's drawing
     def clear_coords(self):
-        self.world_coords = []
+        self.world_coords.clear()
+        if self.simplifier is not None:
+            self.simplifier.reset()
 
     # If the player is still drawing when the time runs out, max out their drawing time
     def round_over(self):
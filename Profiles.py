@@ -0,0 +1,65 @@
+import json
+import os
+import time
+
+import Utility as util
+
+# Lighting profiles are saved here as <name>.json
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+
+
+def profile_path(name):
+    return os.path.join(PROFILE_DIR, name + ".json")
+
+
+def list_profiles():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    return sorted(f[:-len(".json")] for f in os.listdir(PROFILE_DIR) if f.endswith(".json"))
+
+
+def _calibration():
+    # The player colors and the ranges of every color
+    return {"color_order": list(util.COLOR_ORDER),
+            "color_hsv": {c: [list(map(int, low)), list(map(int, high))]
+                          for c, (low, high) in util.COLOR_HSV.items()}}
+
+
+def save_profile(name):
+    """
+    Saves the current calibration (util.COLOR_ORDER and util.COLOR_HSV) as a
+    named lighting profile.
+
+    :param name: profile name
+    :return: path of the saved profile
+    """
+    json_path = profile_path(name)
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+
+    profile = _calibration()
+    profile["name"] = name
+    profile["saved"] = time.strftime("%Y-%m-%d %H:%M:%S")
+
+    with open(json_path, "w") as f:
+        json.dump(profile, f, indent=2)
+    return json_path
+
+
+def load_profile(name):
+    """
+    Loads a lighting profile into util.COLOR_ORDER and util.COLOR_HSV.
+
+    :param name: profile name
+    :return: the profile
+    """
+    json_path = profile_path(name)
+    if not os.path.exists(json_path):
+        raise ValueError("No lighting profile named '%s' (profiles: %s)" % (
+            name, ", ".join(list_profiles()) or "none"))
+    with open(json_path) as f:
+        profile = json.load(f)
+
+    util.COLOR_ORDER[:] = profile["color_order"]
+    for color, (low, high) in profile["color_hsv"].items():
+        util.COLOR_HSV[color] = [tuple(low), tuple(high)]
+    return profile
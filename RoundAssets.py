@@ -0,0 +1,202 @@
+import json
+import os
+import struct
+import cv2
+import numpy as np
+
+import Config
+from EvaluationEngine import EvaluationEngine, EVALUATION_SIZE_1, EVALUATION_SIZE_2
+from RoundCatalog import RoundCatalog
+
+# The round asset pack holds every target preprocessed ahead of time, so a
+#   round starts without reading or resizing any images. Build it with
+#   `python RoundGenerator.py`. It is a small JSON header followed by the raw
+#   arrays, and is memory mapped when loaded so only the pages used are read.
+ROUND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "round_images")
+PACK_PATH = os.path.join(ROUND_DIR, "rounds.pack")
+
+PACK_MAGIC = b"LDRP"
+PACK_VERSION = 1
+# Arrays start on multiples of this many bytes
+PACK_ALIGN = 64
+
+# Playspace sides (pixels) the target overlay is stored at. These are the
+#   sides of 1 and 2 players on 640x480, 1280x720 and 1920x1080 cameras.
+#   Other sides are resized when first used.
+DISPLAY_SIDES = (310, 470, 630, 710, 950, 1070)
+
+
+class RoundTarget:
+    """
+    A round's target with the variants the game uses: the world size image,
+    the mask EvaluationEngine compares drawings with, and the overlays drawn
+    into the playspaces.
+    """
+    def __init__(self, name, image, mask=None, overlays=None, raster=None):
+        """
+        :param name: target name in the round catalog
+        :param image: binary target in world size, 255 on the outline
+        :param mask: image pre-processed for evaluation, computed when None
+        :param overlays: {side: grayscale overlay} already made
+        :param raster: function drawing the target at a size (ie: a vector
+            shape), used for overlays instead of resizing image
+        """
+        self.name = name
+        self.image = image
+        self.raster = raster
+        self.mask = EvaluationEngine._pre_process(image) if mask is None else mask
+        self._gray = dict(overlays or {})
+        self._overlays = {}
+
+    def prepare(self, sides=()):
+        """
+        Reads the mask and makes the overlays for the given playspace sides
+        ahead of time (ie: on a background thread before the round starts),
+        so nothing is read from disk or resized during the round.
+        """
+        self.mask = np.array(self.mask)
+        for side in sides:
+            self.overlay(side)
+        return self
+
+    def overlay(self, side):
+        """
+        :return: the target at half brightness as a BGR image side pixels wide
+        """
+        if side not in self._overlays:
+            gray = self._gray.get(side)
+            if gray is None and self.raster is not None:
+                gray = cv2.divide(self.raster(side), 2)
+            elif gray is None:
+                gray = make_overlay(self.image, side)
+            self._overlays[side] = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+        return self._overlays[side]
+
+
+def make_overlay(image, side):
+    return cv2.divide(cv2.resize(image, (side, side)), 2)
+
+
+def _source_stamp(path):
+    # Changes whenever the image file is replaced or edited
+    stat = os.stat(path)
+    return [int(stat.st_mtime), stat.st_size]
+
+
+def _settings():
+    # Sizes the pack was built for, it is ignored when any of them change
+    return {"world_size": list(Config.WORLD_SPACE_SIZE),
+            "evaluation_sizes": [list(EVALUATION_SIZE_1), list(EVALUATION_SIZE_2)]}
+
+
+def build_pack(images, catalog, path=PACK_PATH, sides=DISPLAY_SIDES):
+    """
+    Writes the asset pack.
+
+    :param images: {target name: world size target}
+    :param catalog: RoundCatalog the targets are in, for their image files
+    :param path: where to write the pack
+    :param sides: playspace sides to store overlays for
+    :return: bytes written
+    """
+    arrays = []
+    targets = {}
+    for name, image in images.items():
+        entry = {"source": _source_stamp(catalog.file_path(name)), "arrays": {}}
+        variants = [("image", image), ("mask", EvaluationEngine._pre_process(image))]
+        variants += [("overlay_%d" % side, make_overlay(image, side)) for side in sides]
+        for key, array in variants:
+            array = np.ascontiguousarray(array)
+            entry["arrays"][key] = {"shape": list(array.shape), "dtype": array.dtype.str}
+            arrays.append((entry["arrays"][key], array))
+        targets[name] = entry
+
+    # Offsets are relative to the end of the header, which is padded to PACK_ALIGN
+    offset = 0
+    for meta, array in arrays:
+        meta["offset"] = offset
+        offset += -(-array.nbytes // PACK_ALIGN) * PACK_ALIGN
+
+    header = dict(_settings(), version=PACK_VERSION, targets=targets)
+    header = json.dumps(header).encode("utf-8")
+    start = -(-(len(PACK_MAGIC) + 4 + len(header)) // PACK_ALIGN) * PACK_ALIGN
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        f.write(PACK_MAGIC + struct.pack("<I", len(header)) + header)
+        for meta, array in arrays:
+            f.seek(start + meta["offset"])
+            f.write(array.tobytes())
+        f.truncate(start + offset)
+    # Replace the old pack in one step, so a game starting meanwhile never sees half of it
+    os.replace(path + ".tmp", path)
+    return start + offset
+
+
+class AssetPack:
+    """
+    A loaded asset pack. Targets are views into the memory mapped file.
+    """
+    def __init__(self, path=PACK_PATH, catalog=None):
+        """
+        :param catalog: RoundCatalog the targets are in, for their image files
+        """
+        self.catalog = RoundCatalog() if catalog is None else catalog
+        with open(path, "rb") as f:
+            magic, length = f.read(len(PACK_MAGIC)), struct.unpack("<I", f.read(4))[0]
+            if magic != PACK_MAGIC:
+                raise ValueError("%s is not a round asset pack" % path)
+            self.header = json.loads(f.read(length).decode("utf-8"))
+        if self.header.get("version") != PACK_VERSION:
+            raise ValueError("%s is from another version, rebuild it" % path)
+
+        start = -(-(len(PACK_MAGIC) + 4 + length) // PACK_ALIGN) * PACK_ALIGN
+        self.path = path
+        self._data = np.memmap(path, np.uint8, mode="r")
+        self._start = start
+
+    def _array(self, meta):
+        return np.ndarray(meta["shape"], np.dtype(meta["dtype"]), buffer=self._data,
+                          offset=self._start + meta["offset"])
+
+    def names(self):
+        return sorted(self.header["targets"])
+
+    def get(self, name):
+        """
+        :return: the RoundTarget of an image, or None when the pack does not
+            have it or the image has changed since the pack was built
+        """
+        entry = self.header["targets"].get(name)
+        if entry is None or name not in self.catalog:
+            return None
+        source = self.catalog.file_path(name)
+        if source is None or not os.path.exists(source) or _source_stamp(source) != entry["source"]:
+            return None
+
+        arrays = entry["arrays"]
+        image = self._array(arrays["image"])
+        # The world size image is still good when only the evaluation sizes changed
+        mask = self._array(arrays["mask"]) if self.header["evaluation_sizes"] == _settings()["evaluation_sizes"] else None
+        overlays = {int(key[len("overlay_"):]): self._array(meta)
+                    for key, meta in arrays.items() if key.startswith("overlay_")}
+        return RoundTarget(name, image, mask, overlays)
+
+
+def load_pack(path=PACK_PATH, catalog=None):
+    """
+    :param catalog: RoundCatalog the targets are in, for their image files
+    :return: the AssetPack, or None when there is no usable pack (targets are
+        then made from the images in round_images)
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        pack = AssetPack(path, catalog)
+    except (ValueError, OSError, struct.error) as e:
+        print("Ignoring %s: %s" % (path, e))
+        return None
+    if pack.header["world_size"] != _settings()["world_size"]:
+        print("Ignoring %s, it was built for another world size" % path)
+        return None
+    return pack
@@ -0,0 +1,218 @@
+import collections
+import json
+import os
+import re
+import threading
+import cv2
+import numpy as np
+
+import Config
+
+# The round catalog is a JSON lines file. The first line is a header with
+#   the playlist the game plays ([name, seconds] in order), every other line
+#   is one target: {"name", "seconds", "difficulty", "tags"} and either
+#   "file" (an image next to the catalog) or "shape" (a vector shape in
+#   coordinates from 0 to 1, drawn at any size without resizing).
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "round_images", "catalog.jsonl")
+
+# Bytes of rasterized targets kept before the least recently used are dropped
+CATALOG_CACHE_BYTES = 64 * 1024 * 1024
+# Catalog entries kept parsed
+PARSED_ENTRIES = 256
+# The "name" of a catalog entry, as a JSON string
+NAME_PATTERN = re.compile(rb'"name"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+# Outline thickness of vector shapes, as a fraction of the image size. About
+#   the thickness of the outlines in the target images.
+VECTOR_THICKNESS = 0.026
+
+# Sharpens thresholded target images (https://stackoverflow.com/questions/4993082/how-to-sharpen-an-image-in-opencv)
+SHARPEN_KERNEL = np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]])
+
+
+class RoundCatalog:
+    """
+    Every round target the game can play, with its metadata. Opening the
+    catalog only reads its header. The rest of the index is scanned the
+    first time a target is looked up, and a target's entry is only parsed
+    when it is used. Rasterized targets are kept in an LRU cache keyed by
+    (name, size) that holds at most max_bytes.
+    """
+    def __init__(self, path=CATALOG_PATH, max_bytes=CATALOG_CACHE_BYTES):
+        """
+        :param path: catalog file, image files are relative to it
+        :param max_bytes: size of the raster cache
+        """
+        self.path = path
+        self.directory = os.path.dirname(path)
+        self.max_bytes = max_bytes
+        with open(path, "rb") as f:
+            header = json.loads(f.readline().decode("utf-8"))
+        self.playlist = [(name, seconds) for name, seconds in header.get("playlist", [])]
+        self._offsets = None
+        self._entries = collections.OrderedDict()
+        self._rasters = collections.OrderedDict()
+        self.cache_bytes = 0
+        # Rounds are prefetched on another thread
+        self._lock = threading.RLock()
+
+    def _index(self):
+        # {name: byte offset of its line}, scanned on first use
+        with self._lock:
+            if self._offsets is None:
+                self._offsets = self._scan()
+        return self._offsets
+
+    def _scan(self):
+        offsets = {}
+        with open(self.path, "rb") as f:
+            f.readline()
+            offset = f.tell()
+            for line in iter(f.readline, b""):
+                if line.strip():
+                    # Only the name is parsed, the rest of the entry is parsed when it is used
+                    match = NAME_PATTERN.search(line)
+                    if match is None:
+                        name = json.loads(line.decode("utf-8"))["name"]
+                    elif b"\\" in match.group(1):
+                        name = json.loads(match.group(1).decode("utf-8"))
+                    else:
+                        name = match.group(1)[1:-1].decode("utf-8")
+                    offsets[name] = offset
+                offset += len(line)
+        return offsets
+
+    def __len__(self):
+        return len(self._index())
+
+    def __contains__(self, name):
+        return name in self._index()
+
+    def names(self):
+        return list(self._index())
+
+    def entry(self, name):
+        """
+        :return: the catalog entry of a target
+        """
+        with self._lock:
+            entry = self._entries.pop(name, None)
+            if entry is None:
+                offset = self._index().get(name)
+                if offset is None:
+                    raise ValueError("No round target named '%s' in %s" % (name, self.path))
+                with open(self.path, "rb") as f:
+                    f.seek(offset)
+                    entry = json.loads(f.readline().decode("utf-8"))
+            # Only recently used entries are kept parsed
+            self._entries[name] = entry
+            while len(self._entries) > PARSED_ENTRIES:
+                self._entries.popitem(last=False)
+            return entry
+
+    def select(self, difficulty=None, tags=()):
+        """
+        :param difficulty: only targets of this difficulty, or None for any
+        :param tags: only targets with every one of these tags
+        :return: [(name, seconds)] of the matching targets, in catalog order
+        """
+        selected = []
+        for name in self._index():
+            entry = self.entry(name)
+            if difficulty is not None and entry.get("difficulty") != difficulty:
+                continue
+            if not set(tags) <= set(entry.get("tags", [])):
+                continue
+            selected.append((name, entry.get("seconds", Config.ROUND_DURATION)))
+        return selected
+
+    def raster(self, name, size):
+        """
+        :param size: width and height of the image
+        :return: the target as a read only binary image, 255 on the outline.
+            Vector shapes are drawn at the size, images are resized to it.
+        """
+        key = (name, size)
+        with self._lock:
+            img = self._rasters.pop(key, None)
+            if img is None:
+                img = self._render(self.entry(name), size)
+                img.flags.writeable = False
+                self.cache_bytes += img.nbytes
+            self._rasters[key] = img
+            while self.cache_bytes > self.max_bytes and len(self._rasters) > 1:
+                self.cache_bytes -= self._rasters.popitem(last=False)[1].nbytes
+            return img
+
+    def image(self, name):
+        """
+        :return: the target in world size
+        """
+        return self.raster(name, Config.WORLD_SPACE_WIDTH)
+
+    def is_vector(self, name):
+        return "shape" in self.entry(name)
+
+    def file_path(self, name):
+        """
+        :return: path of the image file of a target, or None for a vector shape
+        """
+        entry = self.entry(name)
+        return os.path.join(self.directory, entry["file"]) if "file" in entry else None
+
+    def clear(self):
+        with self._lock:
+            self._rasters.clear()
+            self.cache_bytes = 0
+
+    def _render(self, entry, size):
+        if "file" in entry:
+            return self._read_image(os.path.join(self.directory, entry["file"]), size)
+        return draw_shape(entry["shape"], size)
+
+    @staticmethod
+    def _read_image(path, size):
+        # read in image
+        img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            raise ValueError("Could not read round image %s" % path)
+
+        # convert to binary image
+        img = cv2.threshold(img, 127, 255, cv2.THRESH_BINARY)[1]
+
+        # scale image to the size
+        img = cv2.resize(img, (size, size))
+
+        # sharpen image
+        img = cv2.filter2D(img, -1, SHARPEN_KERNEL)
+
+        # invert image so border is 255, and background is 0
+        return 255 - img
+
+
+def draw_shape(shape, size):
+    """
+    Draws a vector shape's outline.
+
+    :param shape: {"type": "polygon", "polyline" or "ellipse", ...} in
+        coordinates from 0 to 1. Polygons and polylines have "points",
+        ellipses have a "center" and "axes". "thickness" overrides
+        VECTOR_THICKNESS.
+    :param size: width and height of the image
+    :return: binary image, 255 on the outline
+    """
+    img = np.zeros((size, size), np.uint8)
+    thickness = max(int(round(shape.get("thickness", VECTOR_THICKNESS) * size)), 1)
+    # Drawn with 4 bits of subpixel precision so small sizes keep their shape
+    scale = size * 16
+    kind = shape["type"]
+    if kind in ("polygon", "polyline"):
+        points = np.round(np.array(shape["points"], np.float64) * scale).astype(np.int32)
+        cv2.polylines(img, [points], kind == "polygon", 255, thickness, cv2.LINE_8, 4)
+    elif kind == "ellipse":
+        center = tuple(int(round(c * scale)) for c in shape["center"])
+        axes = tuple(int(round(a * scale)) for a in shape["axes"])
+        cv2.ellipse(img, center, axes, shape.get("angle", 0), 0, 360, 255, thickness, cv2.LINE_8, 4)
+    else:
+        raise ValueError("Unknown vector shape type '%s'" % kind)
+    return img
@@ -1,51 +1,85 @@
-import cv2
-import Config
-import numpy as np
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import RoundAssets
+from RoundCatalog import RoundCatalog
 
 class RoundGenerator:
 
-    # (target image, seconds to play)
-    rounds = [
-        ("circle.png", 10),
-        ("square.png", 10),
-        ("rectangle.png", 10),
-        ("triangle.png", 10),
-        ("disney.png", 15),
-    ]
+    # Every target the game can play (see RoundCatalog)
+    catalog = RoundCatalog()
+
+    # (target name, seconds to play), the catalog's playlist unless changed
+    rounds = catalog.playlist
+
+    # Asset pack loaded by load_assets, False until then
+    pack = False
+    # Loads rounds in the background (see prefetch)
+    _executor = None
+
+    @staticmethod
+    def load_assets():
+        """
+        Loads the round asset pack, if it has been built. Called once at startup.
+        """
+        RoundGenerator.pack = RoundAssets.load_pack(catalog=RoundGenerator.catalog)
+        return RoundGenerator.pack
 
     @staticmethod
     def get_round(round_number):
         """
         Get the next image
-        :return: (target image in world size, seconds to play)
+        :return: (RoundTarget, seconds to play)
         """
         round = RoundGenerator.rounds[(round_number) % len(RoundGenerator.rounds)]
-        img = RoundGenerator.get_image(round[0])
-        return (img, round[1])
+        return (RoundGenerator.get_target(round[0]), round[1])
 
     @staticmethod
-    def get_image(img_name):
+    def prefetch(round_number, sides=()):
         """
-        Read in image and pre-process it
+        Starts loading a round on a background thread, so the round can
+        start without waiting for disk reads or preprocessing.
 
-        :param img_name: image name to read in
-        :return: pre-processed image in world size
+        :param sides: playspace sides to make the target overlay for
+        :return: Future of get_round(round_number), with the target prepared
         """
-        # read in image
-        img = cv2.imread("round_images/" + img_name, cv2.IMREAD_GRAYSCALE)
+        if RoundGenerator._executor is None:
+            RoundGenerator._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="round prefetch")
+        return RoundGenerator._executor.submit(RoundGenerator._load_round, round_number, sides)
 
-        # convert to binary image
-        img = cv2.threshold(img, 127, 255, cv2.THRESH_BINARY)[1]
+    @staticmethod
+    def _load_round(round_number, sides):
+        target, seconds = RoundGenerator.get_round(round_number)
+        return (target.prepare(sides), seconds)
 
-        # scale image to world coordinates
-        img = cv2.resize(img, Config.WORLD_SPACE_SIZE)
+    @staticmethod
+    def get_target(img_name):
+        """
+        :param img_name: target name in the catalog
+        :return: RoundTarget from the asset pack, or made from the catalog
+            when the pack does not have it
+        """
+        if RoundGenerator.pack is False:
+            RoundGenerator.load_assets()
+        if RoundGenerator.pack is not None:
+            target = RoundGenerator.pack.get(img_name)
+            if target is not None:
+                return target
+        catalog = RoundGenerator.catalog
+        raster = functools.partial(catalog.raster, img_name) if catalog.is_vector(img_name) else None
+        return RoundAssets.RoundTarget(img_name, RoundGenerator.get_image(img_name), raster=raster)
 
-        # sharpen image (https://stackoverflow.com/questions/4993082/how-to-sharpen-an-image-in-opencv)
-        kernel = np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]])
-        img = cv2.filter2D(img, -1, kernel)
+    @staticmethod
+    def get_image(img_name):
+        """
+        :param img_name: target name in the catalog
+        :return: binary target in world size, 255 on the outline (read only)
+        """
+        return RoundGenerator.catalog.image(img_name)
 
-        # invert image so border is 255, and background is 0
-        img = (255 - img)
 
-        # return image
-        return img
+# Build the round asset pack from every target image in the rounds. Vector
+#   targets are drawn at any size and are not packed.
+if __name__ == "__main__":
+    names = sorted(set(name for name, seconds in RoundGenerator.rounds if not RoundGenerator.catalog.is_vector(name)))
+    size = RoundAssets.build_pack({name: RoundGenerator.get_image(name) for name in names}, RoundGenerator.catalog)
+    print("Wrote %d targets to %s (%.1f MB)" % (len(names), RoundAssets.PACK_PATH, size / 1e6))
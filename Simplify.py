@@ -0,0 +1,142 @@
+import numpy as np
+
+import Config
+
+# Longest run of points checked against a straight segment before the run
+#   is ended anyway, which keeps the cost per point bounded
+MAX_RUN = 64
+
+
+def _segment_distances(points, a, b):
+    """
+    :param points: (n, 2) array
+    :return: distance of every point to the segment a-b
+    """
+    a = np.asarray(a, np.float64)
+    d = np.asarray(b, np.float64) - a
+    rel = np.asarray(points, np.float64) - a
+    length = d.dot(d)
+    if length == 0:
+        return np.hypot(rel[:, 0], rel[:, 1])
+    t = np.clip(rel.dot(d) / length, 0, 1)
+    off = rel - t[:, None] * d
+    return np.hypot(off[:, 0], off[:, 1])
+
+
+def simplify_rdp(xy, tolerance):
+    """
+    Ramer-Douglas-Peucker simplification of one stroke.
+
+    :param xy: (n, 2) array of points
+    :param tolerance: furthest any dropped point may be from the simplified stroke
+    :return: indexes of the points to keep, always including the first and last
+    """
+    n = len(xy)
+    if n < 3:
+        return np.arange(n)
+    keep = np.zeros(n, np.bool_)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        dist = _segment_distances(xy[start + 1:end], xy[start], xy[end])
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            mid = start + 1 + i
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+    return np.flatnonzero(keep)
+
+
+class StrokeSimplifier:
+    """
+    Simplifies a stroke as its points arrive, before they are stored.
+
+    Points closer than the tolerance to the last stored point are dropped.
+    While new points stay within the tolerance of a straight segment from
+    the last fixed point, the stored stroke ends in a provisional point that
+    is moved along instead of adding a new one. Once the stroke reaches
+    max_points, it is simplified again with twice the tolerance.
+    """
+    def __init__(self, tolerance=None, max_points=None):
+        """
+        :param tolerance: in the units of the points, defaults to Config.SIMPLIFY_TOLERANCE
+        :param max_points: points per round, defaults to Config.MAX_STROKE_POINTS
+        """
+        self.base_tolerance = Config.SIMPLIFY_TOLERANCE if tolerance is None else tolerance
+        self.max_points = Config.MAX_STROKE_POINTS if max_points is None else max_points
+        self.reset()
+
+    def reset(self):
+        self.tolerance = self.base_tolerance
+        self._anchor = None
+        self._run = []
+        self.received = 0
+
+    def add(self, stroke, point, timestamp):
+        """
+        :param stroke: StrokeBuffer to add to
+        :param point: (x, y), or None for a pen-up break
+        :param timestamp: when the point was captured (time.time())
+        """
+        self.received += 1
+        if point is None:
+            stroke.provisional = False
+            stroke.append(None, timestamp)
+            self._anchor = None
+            self._run = []
+            return
+
+        if self._anchor is None:
+            # First point of a stroke is always kept
+            stroke.provisional = False
+            stroke.append(point, timestamp)
+            self._anchor = point
+            self._run = []
+            return
+
+        last = stroke[-1]
+        if (point[0] - last[0]) ** 2 + (point[1] - last[1]) ** 2 < self.tolerance ** 2:
+            return
+
+        self._run.append(point)
+        if stroke.provisional and len(self._run) <= MAX_RUN and \
+                _segment_distances(self._run, self._anchor, point).max() <= self.tolerance:
+            stroke.replace_last(point, timestamp)
+        else:
+            if stroke.provisional:
+                # The provisional point is fixed, the run starts again from it
+                self._anchor = last
+                self._run = [point]
+            stroke.append(point, timestamp)
+            stroke.provisional = True
+
+        if len(stroke) > self.max_points:
+            self.compact(stroke)
+
+    def compact(self, stroke):
+        """
+        Simplifies the stored stroke again with twice the tolerance, until it fits in max_points.
+        """
+        while len(stroke) > self.max_points:
+            self.tolerance *= 2
+            xy, times, pen_up = stroke.xy, stroke.times, stroke.pen_up
+            keep = []
+            breaks = np.flatnonzero(pen_up)
+            start = 0
+            for end in list(breaks) + [len(xy)]:
+                if end > start:
+                    keep.extend(start + simplify_rdp(xy[start:end], self.tolerance))
+                if end < len(xy):
+                    keep.append(end)
+                start = end + 1
+            keep = np.array(keep, np.intp)
+            stroke.load(xy[keep].copy(), times[keep].copy(), pen_up[keep].copy())
+        # The last point is fixed and a new run starts from it
+        stroke.provisional = False
+        if len(stroke) > 0 and stroke[-1] is not None:
+            self._anchor = stroke[-1]
+            self._run = []
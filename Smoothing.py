@@ -0,0 +1,209 @@
+import copy
+import math
+import numpy as np
+
+import Config
+
+# Stroke smoothing filters. A smoother is fed one point at a time and
+#   returns the smoothed point right away, so only new points are ever
+#   processed. None (a pen-up break) is passed through and starts a new
+#   stroke, so strokes on either side of a break are smoothed separately.
+
+# Frame rate assumed by filters that need time when points have no timestamps
+DEFAULT_RATE = 30
+
+
+class StrokeSmoother:
+    """
+    Base class of the smoothing filters.
+    """
+    def reset(self):
+        raise NotImplementedError
+
+    def _filter(self, x, y, timestamp):
+        raise NotImplementedError
+
+    def push(self, point, timestamp=None):
+        """
+        :param point: (x, y), or None for a pen-up break
+        :param timestamp: when the point was captured, in seconds. Only used by
+            filters that depend on time.
+        :return: smoothed (x, y) as ints, or None for a pen-up break
+        """
+        if point is None:
+            self.reset()
+            return None
+        x, y = self._filter(point[0], point[1], timestamp)
+        return int(x), int(y)
+
+    def copy(self):
+        """
+        :return: an independent smoother in the same state (ie: to try a point without keeping it)
+        """
+        clone = copy.copy(self)
+        for name, value in vars(self).items():
+            if isinstance(value, (np.ndarray, list)):
+                setattr(clone, name, value.copy())
+        return clone
+
+    def smooth(self, points):
+        """
+        Smooths a whole list of points from the start of a stroke.
+
+        :return: list of smoothed points, the same length as points
+        """
+        self.reset()
+        return [self.push(p) for p in points]
+
+    def smooth_array(self, xy, pen_up, times=None):
+        """
+        Same as smooth, for arrays of points (ie: StrokeBuffer.xy and .pen_up).
+
+        :param xy: (n, 2) array of points
+        :param pen_up: n flags, True for pen-up breaks
+        :param times: n timestamps in seconds, or None
+        :return: (n, 2) int32 array of smoothed points. Rows of pen-up breaks are undefined.
+        """
+        self.reset()
+        out = np.zeros((len(xy), 2), np.int32)
+        times = [None] * len(xy) if times is None else times.tolist()
+        for i, (x, y) in enumerate(xy.tolist()):
+            point = self.push(None if pen_up[i] else (x, y), times[i])
+            if point is not None:
+                out[i] = point
+        return out
+
+
+class MovingAverage(StrokeSmoother):
+    """
+    Mean of the last size points, kept in a ring buffer with a running sum.
+    """
+    def __init__(self, size=3):
+        self.size = size
+        self._ring = np.zeros((size, 2), np.int64)
+        self.reset()
+
+    def reset(self):
+        self._count = 0
+        self._sum = [0, 0]
+
+    def _filter(self, x, y, timestamp):
+        slot = self._count % self.size
+        if self._count >= self.size:
+            # Drop the oldest point from the window
+            self._sum[0] -= int(self._ring[slot, 0])
+            self._sum[1] -= int(self._ring[slot, 1])
+        self._ring[slot] = (x, y)
+        self._sum[0] += x
+        self._sum[1] += y
+        self._count += 1
+        n = min(self._count, self.size)
+        return self._sum[0] / n, self._sum[1] / n
+
+    def smooth_array(self, xy, pen_up, times=None):
+        # Vectorized: window sums from a cumulative sum over every stroke between breaks
+        self.reset()
+        out = np.zeros((len(xy), 2), np.int32)
+        breaks = np.flatnonzero(pen_up)
+        starts = np.concatenate(([0], breaks + 1))
+        ends = np.concatenate((breaks, [len(xy)]))
+        for start, end in zip(starts, ends):
+            if end <= start:
+                continue
+            stroke = xy[start:end].astype(np.int64)
+            cum = np.concatenate((np.zeros((1, 2), np.int64), np.cumsum(stroke, axis=0)))
+            idx = np.arange(1, end - start + 1)
+            first = np.maximum(idx - self.size, 0)
+            counts = (idx - first)[:, None]
+            out[start:end] = ((cum[idx] - cum[first]) / counts).astype(np.int32)
+        return out
+
+
+class Exponential(StrokeSmoother):
+    """
+    Exponential moving average. Higher alpha follows the wand more closely.
+    """
+    def __init__(self, alpha=0.5):
+        self.alpha = alpha
+        self._state = np.zeros(2, np.float64)
+        self.reset()
+
+    def reset(self):
+        self._started = False
+
+    def _filter(self, x, y, timestamp):
+        if not self._started:
+            self._state[:] = (x, y)
+            self._started = True
+        else:
+            self._state += self.alpha * (np.array((x, y), np.float64) - self._state)
+        return self._state[0], self._state[1]
+
+
+class OneEuro(StrokeSmoother):
+    """
+    One euro filter (Casiez et al. 2012): smooths a lot while the wand is
+    slow, to remove jitter, and little while it is fast, to avoid lag.
+    """
+    def __init__(self, min_cutoff=1.0, beta=0.05, d_cutoff=1.0, rate=DEFAULT_RATE):
+        """
+        :param min_cutoff: cutoff frequency (Hz) when the wand is still
+        :param beta: how quickly the cutoff rises with speed
+        :param d_cutoff: cutoff frequency (Hz) of the speed estimate
+        :param rate: points per second assumed when there are no timestamps
+        """
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.rate = rate
+        self._value = np.zeros(2, np.float64)
+        self._speed = np.zeros(2, np.float64)
+        self.reset()
+
+    def reset(self):
+        self._started = False
+        self._last_time = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def _filter(self, x, y, timestamp):
+        point = np.array((x, y), np.float64)
+        if not self._started:
+            self._value[:] = point
+            self._speed[:] = 0
+            self._started = True
+            self._last_time = timestamp
+            return x, y
+
+        dt = 1.0 / self.rate
+        if timestamp is not None and self._last_time is not None and timestamp > self._last_time:
+            dt = timestamp - self._last_time
+        self._last_time = timestamp
+
+        speed = (point - self._value) / dt
+        self._speed += self._alpha(self.d_cutoff, dt) * (speed - self._speed)
+        cutoff = self.min_cutoff + self.beta * np.abs(self._speed)
+        self._value += np.array([self._alpha(c, dt) for c in cutoff]) * (point - self._value)
+        return self._value[0], self._value[1]
+
+
+# Smoothing filters by name
+SMOOTHERS = {
+    "moving_average": MovingAverage,
+    "exponential": Exponential,
+    "one_euro": OneEuro,
+}
+
+
+def make_smoother(name=None):
+    """
+    :param name: filter name in SMOOTHERS, defaults to Config.SMOOTHING_FILTER
+    :return: a new smoother
+    """
+    name = Config.SMOOTHING_FILTER if name is None else name
+    if name not in SMOOTHERS:
+        raise ValueError("Unknown smoothing filter '%s', choose from: %s" % (name, ", ".join(sorted(SMOOTHERS))))
+    return SMOOTHERS[name]()
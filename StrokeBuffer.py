@@ -0,0 +1,150 @@
+import numpy as np
+
+# Points a new StrokeBuffer has room for before it has to grow
+STROKE_CAPACITY = 256
+
+
+class StrokeBuffer:
+    """
+    A player's stroke points in preallocated arrays: int16 x/y, float32
+    timestamps relative to the first point, and a pen-up flag. A point takes
+    9 bytes instead of the ~100 of a tuple in a list. The arrays double in
+    size when full.
+
+    Indexing and iterating give (x, y) tuples, or None for a pen-up break,
+    like the list of points it replaces. xy, times and pen_up are NumPy
+    views of the stored points without copying. They stay valid until the
+    next append or clear.
+    """
+    __slots__ = ("_xy", "_times", "_pen_up", "_len", "start_time", "generation", "version", "provisional")
+
+    def __init__(self, capacity=STROKE_CAPACITY):
+        self._xy = np.zeros((capacity, 2), np.int16)
+        self._times = np.zeros(capacity, np.float32)
+        self._pen_up = np.zeros(capacity, np.bool_)
+        self._len = 0
+        # time.time() the timestamps are relative to, set by the first append
+        self.start_time = None
+        # Incremented by clear() and load(), so anything drawn from the old points can tell
+        self.generation = 0
+        # Incremented by every change, so anything drawn from the points can tell it is out of date
+        self.version = 0
+        # True while the last point may still be moved by replace_last
+        self.provisional = False
+
+    def _grow(self):
+        capacity = max(len(self._xy) * 2, 1)
+        for name in ("_xy", "_times", "_pen_up"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], old.dtype)
+            new[:self._len] = old[:self._len]
+            setattr(self, name, new)
+
+    def append(self, point, timestamp=0.0):
+        """
+        :param point: (x, y), or None for a pen-up break
+        :param timestamp: when the point was captured (time.time())
+        """
+        if self._len == len(self._xy):
+            self._grow()
+        if self.start_time is None:
+            self.start_time = timestamp
+        i = self._len
+        if point is None:
+            self._xy[i] = 0
+            self._pen_up[i] = True
+        else:
+            self._xy[i] = point
+            self._pen_up[i] = False
+        self._times[i] = timestamp - self.start_time
+        self._len += 1
+        self.version += 1
+
+    def replace_last(self, point, timestamp=0.0):
+        """
+        Moves the last point (ie: to extend a straight run of points).
+        """
+        i = self._len - 1
+        self._xy[i] = point
+        self._pen_up[i] = False
+        self._times[i] = timestamp - self.start_time
+        self.version += 1
+
+    def clear(self):
+        self._len = 0
+        self.start_time = None
+        self.provisional = False
+        self.generation += 1
+        self.version += 1
+
+    def load(self, xy, times, pen_up):
+        """
+        Replaces every point (ie: with a simplified copy of them).
+
+        :param times: timestamps relative to start_time
+        """
+        while len(self._xy) < len(xy):
+            self._grow()
+        n = len(xy)
+        self._xy[:n] = xy
+        self._times[:n] = times
+        self._pen_up[:n] = pen_up
+        self._len = n
+        self.generation += 1
+        self.version += 1
+
+    @property
+    def xy(self):
+        return self._xy[:self._len]
+
+    @property
+    def times(self):
+        return self._times[:self._len]
+
+    @property
+    def pen_up(self):
+        return self._pen_up[:self._len]
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._len))]
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError("stroke index out of range")
+        if self._pen_up[i]:
+            return None
+        return (int(self._xy[i, 0]), int(self._xy[i, 1]))
+
+    def __iter__(self):
+        pen_up = self.pen_up
+        for i, (x, y) in enumerate(self.xy.tolist()):
+            yield None if pen_up[i] else (x, y)
+
+    def to_json(self):
+        """
+        :return: the points and their timestamps (relative to start_time) as
+            JSON friendly lists, with None for pen-up breaks
+        """
+        return {"points": [None if p is None else list(p) for p in self],
+                "times": [round(t, 4) for t in self.times.tolist()]}
+
+    @staticmethod
+    def from_json(record):
+        """
+        :param record: what to_json returned
+        :return: a new StrokeBuffer with the same points
+        """
+        stroke = StrokeBuffer(max(len(record["points"]), 1))
+        for point, timestamp in zip(record["points"], record["times"]):
+            stroke.append(None if point is None else tuple(point), timestamp)
+        return stroke
+
+    def nbytes(self):
+        """
+        :return: bytes allocated for points
+        """
+        return self._xy.nbytes + self._times.nbytes + self._pen_up.nbytes
@@ -1,10 +1,25 @@
+import collections
 import cv2
 import numpy as np
 import Utility
-import Config
 
 NORMAL_FONT = cv2.FONT_HERSHEY_DUPLEX
 
+# Extra thickness of the drop shadow drawn under text
+SHADOW_STROKE = 5
+
+# Rendered text kept for reuse. Labels are drawn from here every frame, and
+#   values that change (ie: timers) push out the least recently used.
+TEXT_CACHE_ENTRIES = 256
+
+# A rendered piece of text with its drop shadow, placed at (dx, dy) from the
+#   text's baseline origin. It is drawn as pixel * keep / 255 + fill, where
+#   keep is how much of the background shows through (0-255) and fill is the
+#   color the text and shadow add. text_size is what cv2.getTextSize returns.
+TextSprite = collections.namedtuple("TextSprite", ["keep", "fill", "dx", "dy", "text_size"])
+
+_sprites = collections.OrderedDict()
+
 
 def _draw_line(img, pt1, pt2, color=(255, 255, 255), stroke=1, gap=20):
     """
@@ -55,36 +70,128 @@ def _draw_text(img, text, x_pos, y_pos, size=1, color=(255, 255, 255), stroke=2)
     if y_pos < 0 or y_pos > 1:
         raise ValueError("Invalid text position: Y must be between 0 and 1")
 
-    text_size = cv2.getTextSize(text, NORMAL_FONT, size, stroke)[0]
+    sprite = _text_sprite(text, size, stroke, color)
+    text_size = sprite.text_size
 
     # Calculate position based on image size
     text_x = int((img.shape[1] - text_size[0]) * x_pos)
     text_y = int((img.shape[0] + text_size[1]) * y_pos)
 
-    # Draw poor man's drop shadow
-    cv2.putText(img, text, (text_x, text_y), NORMAL_FONT, size, (0, 0, 0), stroke + 5)
+    return _put_sprite(img, sprite, text_x, text_y)
+
+
+def _draw_text_in(img, text, tl, br, x_pos, y_pos, size=1, color=(255, 255, 255), stroke=2):
+    """
+    Draws text at the specified position inside a region of the image.
+    :param tl: Upper left corner of the region
+    :param br: Lower right corner of the region
+    (other params are the same as _draw_text)
+    :return: Mutated image
+    """
+    sprite = _text_sprite(text, size, stroke, color)
+    text_size = sprite.text_size
+
+    # Calculate position based on region size
+    text_x = int(tl[0] + (br[0] - tl[0] - text_size[0]) * x_pos)
+    text_y = int(tl[1] + (br[1] - tl[1] + text_size[1]) * y_pos)
+
+    return _put_sprite(img, sprite, text_x, text_y)
 
-    # Draw text
-    cv2.putText(img, text, (text_x, text_y), NORMAL_FONT, size, color, stroke)
+
+def _text_sprite(text, size, stroke, color):
+    """
+    Renders text and its drop shadow once, and then returns it from the cache.
+    :return: TextSprite
+    """
+    key = (text, size, stroke, tuple(color))
+    sprite = _sprites.pop(key, None)
+    if sprite is None:
+        text_size = cv2.getTextSize(text, NORMAL_FONT, size, stroke)[0]
+        # The shadow's thicker strokes also make it wider than the text
+        (width, height), baseline = cv2.getTextSize(text, NORMAL_FONT, size, stroke + SHADOW_STROKE)
+        pad = stroke + SHADOW_STROKE
+        canvas = np.zeros((height + baseline + 2 * pad, width + 2 * pad), np.uint8)
+        origin = (pad, pad + height)
+
+        # Coverage of the poor man's drop shadow and of the text on top of it
+        shadow = cv2.putText(canvas.copy(), text, origin, NORMAL_FONT, size, 255, stroke + SHADOW_STROKE)
+        fill = cv2.putText(canvas, text, origin, NORMAL_FONT, size, 255, stroke)
+
+        # Only keep the part that was drawn on
+        x, y, w, h = cv2.boundingRect(shadow)
+        shadow = shadow[y:y + h, x:x + w].astype(np.float32) / 255
+        fill = fill[y:y + h, x:x + w].astype(np.float32) / 255
+
+        # The shadow blacks out the background, then the text is blended over it
+        keep = (1 - shadow) * (1 - fill)
+        keep = np.round(np.repeat(keep[..., None], 3, axis=2) * 255).astype(np.uint8)
+        fill = np.round(fill[..., None] * np.array(color, np.float32)).astype(np.uint8)
+        sprite = TextSprite(keep, fill, x - origin[0], y - origin[1], text_size)
+    _sprites[key] = sprite
+    while len(_sprites) > TEXT_CACHE_ENTRIES:
+        _sprites.popitem(last=False)
+    return sprite
+
+
+def _put_sprite(img, sprite, text_x, text_y):
+    """
+    Draws text with a drop shadow, with its baseline starting at (text_x, text_y).
+    :param sprite: the text rendered by _text_sprite
+    :return: Mutated image
+    """
+
+    # Clip the sprite to the image
+    x0, y0 = text_x + sprite.dx, text_y + sprite.dy
+    h, w = sprite.keep.shape[:2]
+    cx0, cy0 = max(x0, 0), max(y0, 0)
+    cx1, cy1 = min(x0 + w, img.shape[1]), min(y0 + h, img.shape[0])
+    if cx1 <= cx0 or cy1 <= cy0:
+        return img
+    sy, sx = slice(cy0 - y0, cy1 - y0), slice(cx0 - x0, cx1 - x0)
+    region = img[cy0:cy1, cx0:cx1]
+
+    cv2.multiply(region, sprite.keep[sy, sx], dst=region, scale=1 / 255)
+    cv2.add(region, sprite.fill[sy, sx], dst=region)
 
     return img
 
 
-def _draw_frame(img, labels=True):
+def _grid_cells(img, ps):
     """
-    Draw the "split-screen" 2-player frame.
+    Returns the (upper left, lower right) of the grid cell around each player's playspace.
     :param img: OpenCV image
-    :return: Mutated image
+    :param ps: Playerspace details indicating the drawable area
     """
+    width, height = img.shape[1], img.shape[0]
+    cols, rows = ps["cols"], ps["rows"]
+    cells = []
+    for i in range(len(ps["spaces"])):
+        col, row = i % cols, i // cols
+        cells.append(((int(col * width / cols), int(row * height / rows)),
+                      (int((col + 1) * width / cols), int((row + 1) * height / rows))))
+    return cells
 
-    line_start = (int(img.shape[1] / 2), 0)
-    line_end = (int(img.shape[1] / 2), img.shape[0])
 
-    _draw_line(img, line_start, line_end, color=(200, 200, 200), stroke=2)
+def _draw_frame(img, labels=True, ps=None):
+    """
+    Draw the "split-screen" frame, with one cell per player.
+    :param img: OpenCV image
+    :param ps: Playerspace details, defaults to the playspace of the image
+    :return: Mutated image
+    """
+    if ps is None:
+        ps = Utility.playable_space(img)
+
+    for col in range(1, ps["cols"]):
+        x = int(img.shape[1] * col / ps["cols"])
+        _draw_line(img, (x, 0), (x, img.shape[0]), color=(200, 200, 200), stroke=2)
+    for row in range(1, ps["rows"]):
+        y = int(img.shape[0] * row / ps["rows"])
+        _draw_line(img, (0, y), (img.shape[1], y), color=(200, 200, 200), stroke=2)
 
     if labels:
-        _draw_text(img, "Player 1", 0.2, 0.9)
-        _draw_text(img, "Player 2", 0.8, 0.9)
+        for i, (tl, br) in enumerate(_grid_cells(img, ps)):
+            _draw_text_in(img, "Player %d" % (i + 1), tl, br, 0.5, 0.9)
 
     return img
 
@@ -139,21 +246,42 @@ def countdown(frame, countdown):
     return frame
 
 
-def playing_round(frame, ps, round, round_time, target, p1_img, p2_img):
+def _draw_drawings(frame, ps, target, drawings):
+    """
+    Draws the target and each player's drawing into their playspace.
+    :return: Mutated image
+    """
+    rz = target.overlay(ps["side"])
+
+    for i, drawing in enumerate(drawings):
+        space = Utility.crop_playspace(frame, ps, i)
+        cv2.add(rz, space, space)
+        cv2.add(space, drawing, space)
+
+    return frame
+
+
+def playing_round(frame, ps, round, round_time, target, drawings, accuracies=None):
     """
     Draws the playing screen.
     :param frame: OpenCV image
     :param ps: Playerspace details indicating the drawable area
     :param round: Current round
     :param round_time: Time left in the round
-    :param target: Target image overlay
-    :param p1_coords: Player 1 coordinates in pixel space
-    :param p2_coords: Player 2 coordinates in pixel space
+    :param target: RoundTarget to overlay
+    :param drawings: Each player's drawing, the size of their playspace
+    :param accuracies: Live percent accuracy (between 0 and 1) for each player
     :return: Mutated image
     """
 
     # Player frame
-    _draw_frame(frame)
+    _draw_frame(frame, ps=ps)
+
+    # Live accuracy, above each player's label
+    if accuracies is not None:
+        size = 0.7 / ps["rows"]
+        for accuracy, (tl, br) in zip(accuracies, _grid_cells(frame, ps)):
+            _draw_text_in(frame, "Accuracy: %d%%" % int(accuracy * 100), tl, br, 0.5, 0.83, size=size, stroke=1)
 
     # Round info
     _draw_text(frame, f"Round {round}", 0.99, 0.05)
@@ -162,89 +290,66 @@ def playing_round(frame, ps, round, round_time, target, p1_img, p2_img):
     _draw_text(frame, "%.1f" % round_time, 0.99, 0.95)
 
     # Image overlay/player coordinates
-    rz = cv2.resize(target, (ps["side"], ps["side"]))
-    rz = cv2.cvtColor(rz, cv2.COLOR_GRAY2BGR)
-
-    p1space = Utility.crop_playspace(frame, ps, Config.PLAYER_ONE)
-    p2space = Utility.crop_playspace(frame, ps, Config.PLAYER_TWO)
-
     Utility.draw_playspace(frame, ps)
-
-    cv2.add(cv2.divide(rz, 2), p1space, p1space)
-    cv2.add(cv2.divide(rz, 2), p2space, p2space)
-    cv2.add(p1space, p1_img, p1space)
-    cv2.add(p2space, p2_img, p2space)
+    _draw_drawings(frame, ps, target, drawings)
 
     return frame
 
 
-def post_round(frame, countdown, p1_score, p2_score, p1_accuracy, p2_accuracy, ps, target, p1_img, p2_img):
+def post_round(frame, countdown, scores, accuracies, ps, target, drawings):
     """
     Draws the end of round screen.
     :param frame: OpenCV image
     :param countdown: Time left until next round
-    :param p1_score: Score for player 1
-    :param p2_score: Score for player 2
-    :param p1_accuracy: Percent accuracy (between 0 and 1) for player 1
-    :param p2_accuracy: Percent accuracy (between 0 and 1) for player 2
+    :param scores: Score for each player
+    :param accuracies: Percent accuracy (between 0 and 1) for each player
     :param ps: Playerspace details indicating the drawable area
-    :param target: Target image overlay
-    :param p1_coords: Player 1 coordinates in pixel space
-    :param p2_coords: Player 2 coordinates in pixel space
+    :param target: RoundTarget to overlay
+    :param drawings: Each player's drawing, the size of their playspace
     :return: Mutated image
     """
 
-    rz = cv2.resize(target, (ps["side"], ps["side"]))
-    rz = cv2.cvtColor(rz, cv2.COLOR_GRAY2BGR)
-
-    p1space = Utility.crop_playspace(frame, ps, Config.PLAYER_ONE)
-    p2space = Utility.crop_playspace(frame, ps, Config.PLAYER_TWO)
-
-    cv2.add(cv2.divide(rz, 2), p1space, p1space)
-    cv2.add(cv2.divide(rz, 2), p2space, p2space)
-    cv2.add(p1space, p1_img, p1space)
-    cv2.add(p2space, p2_img, p2space)
+    _draw_drawings(frame, ps, target, drawings)
 
     # Player frame
-    _draw_frame(frame, labels=False)
+    _draw_frame(frame, labels=False, ps=ps)
 
     # Timer
     _draw_text(frame, "%.1f" % countdown, 0.99, 0.95)
 
-    # Player 1 stats
-    _draw_text(frame, "Player 1", 0.15, 0.4, size=2)
-    _draw_text(frame, "Score: %.1f" % p1_score, 0.14, 0.5)
-    _draw_text(frame, "Accuracy: %d%%" % int(p1_accuracy * 100), 0.15, 0.55)
-
-    # Player 2 stats
-    _draw_text(frame, "Player 2", 0.85, 0.4, size=2)
-    _draw_text(frame, "Score: %.1f" % p2_score, 0.80, 0.5)
-    _draw_text(frame, "Accuracy: %d%%" % int(p2_accuracy * 100), 0.85, 0.55)
+    # Player stats, smaller when the cells are stacked
+    size = 1.0 / ps["rows"]
+    for i, (tl, br) in enumerate(_grid_cells(frame, ps)):
+        _draw_text_in(frame, "Player %d" % (i + 1), tl, br, 0.5, 0.4, size=2 * size)
+        _draw_text_in(frame, "Score: %.1f" % scores[i], tl, br, 0.5, 0.5, size=size)
+        _draw_text_in(frame, "Accuracy: %d%%" % int(accuracies[i] * 100), tl, br, 0.5, 0.55, size=size)
 
     return frame
 
 
-def end_game(frame, p1_score, p2_score):
+def end_game(frame, scores):
     """
     Draw the end game/scoreboard screen.
     :param frame: OpenCV image
-    :param p1_score: Overall score for player 1
-    :param p2_score: Overall score for player 2
+    :param scores: Overall score for each player
     :return: Mutated image
     """
     # Header
     _draw_text(frame, "Game Over", 0.5, 0.2, size=3, stroke=5)
 
-    # Scoreboard
-    def winner(player):
-        if player == 'p1' and p1_score > p2_score:
-            return "*"
-        elif player == 'p2' and p2_score > p1_score:
-            return "*"
-        return ""
+    # Scoreboard ranked by score, players with the same score share a place.
+    #   The winner gets a star (nobody on a tie).
+    ranking = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+    best = scores[ranking[0]]
+    winners = [s for s in scores if s == best]
 
-    _draw_text(frame, f"{winner('p1')}Player 1: {int(p1_score)}", 0.5, 0.4)
-    _draw_text(frame, f"{winner('p2')}Player 2: {int(p2_score)}", 0.5, 0.5)
+    spacing = min(0.1, 0.5 / len(scores))
+    place = 0
+    for row, i in enumerate(ranking):
+        if row == 0 or scores[i] != scores[ranking[row - 1]]:
+            place = row + 1
+        winner = "*" if scores[i] == best and len(winners) == 1 else ""
+        _draw_text(frame, f"{winner}{place}. Player {i + 1}: {int(scores[i])}", 0.5, 0.4 + spacing * row)
 
     # "Press SPACE to play again"
     _draw_cta(frame, "play again", key="R")
@@ -260,8 +365,8 @@ if __name__ == "__main__":
         pre_round(img, 1)
         # countdown(img, 5)
         # playing_round(2, 32, None, None, None)
-        # post_round(img, 4, 14623, 12345, 0.84, 0.95)
-        # end_game(img, 14623, 12345)
+        # post_round(img, 4, [14623, 12345], [0.84, 0.95], Utility.playable_space(img), target, drawings)
+        # end_game(img, [14623, 12345])
 
         cv2.imshow('image', img)
         cv2.waitKey(0)
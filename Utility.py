@@ -3,6 +3,7 @@ import sys
 import time
 import numpy as np
 import cv2
+import Config
 from Config import *
 
 # Brush size for drawing
@@ -13,24 +14,29 @@ PLAYSPACE_BUFFER = 10
 
 # The color order defines the player order as well.
 # 'green' is the first player, yellow is the second
+# Add more colors to play with more players (see Config.NUM_PLAYERS)
 COLOR_ORDER = [
     'yellow',
     'green' 
     # 'blue' # <- Not really working
+    # 'red' # <- Not calibrated yet
 ]
 
 PRIMARY_COLORS = {
     "blue":(255, 0, 0),
     "green":(0, 255, 0),
-    "yellow":(0, 255, 255)
+    "yellow":(0, 255, 255),
+    "red":(0, 0, 255)
 }
 
 COLOR_HSV = {
     "green": [(70, 28, 235), (110, 68, 275)],#[(48, 81, 242), (68, 101, 262)], # TODO: Fix tolerences
     "blue": [(75, 153, 235), (115, 193, 275)],#[(80, 233, 233), (120, 273, 273)],
     # From: https://stackoverflow.com/questions/9179189/detect-yellow-color-in-opencv
-    "yellow": [(4, 10, 233), (48, 54, 277)] #[(10, 90, 235), (50, 130, 275)]
+    "yellow": [(4, 10, 233), (48, 54, 277)], #[(10, 90, 235), (50, 130, 275)]
  # TODO: Fix tolerences
+    # Red hue wraps around from 180 to 0, so the lower hue is above the upper hue
+    "red": [(170, 100, 200), (10, 255, 255)]
 }
 
 def get_elapsed_time(start_time, end_time=None):
@@ -44,8 +50,19 @@ def get_elapsed_time(start_time, end_time=None):
     return end_time - start_time
 
 
-# Will return the upper left, lower right of the two playable
-#   spaces.
+# Returns the number of (columns, rows) that fits the biggest square playspaces
+#   for num_players on a width x height frame
+def playspace_grid(width, height, num_players):
+    best = None
+    for cols in range(1, num_players + 1):
+        rows = -(-num_players // cols)
+        side = min(width / cols, height / rows)
+        if best is None or side > best[0]:
+            best = (side, cols, rows)
+    return best[1], best[2]
+
+# Will return the upper left, lower right of every player's playable
+#   space, laid out on a grid. With two players:
 # +-------------+
 # |      |      |
 # |ltl   |rtl   |
@@ -54,45 +71,129 @@ def get_elapsed_time(start_time, end_time=None):
 # |      |      |
 # +-------------+
 #       midx
-def playable_space(frame):
+# "spaces" holds the (upper left, lower right) of each player in order. Every
+#   playspace is a square of "side" pixels centered in its grid cell.
+def playable_space(frame, num_players=None):
+    if num_players is None:
+        num_players = Config.NUM_PLAYERS
     width = int(frame.shape[1])
     height = int(frame.shape[0])
-    side = int(width/2) - PLAYSPACE_BUFFER
-
-    # vertical & horizontal offset
-    vOffset = (height-side)/2
-    hOffset = (width-side*2)/4
-    midx = int(width/2)
-
-    return {"ltl":(int(hOffset), int(vOffset)), "lbr":(int(midx-hOffset), int(height-vOffset)),
-            "rtl":(int(midx+hOffset), int(vOffset)), "rbr":(int(width-hOffset), int(height-vOffset)),
-            "side":side}
+    cols, rows = playspace_grid(width, height, num_players)
+    side = int(min(width / cols, height / rows)) - PLAYSPACE_BUFFER
+
+    spaces = []
+    for i in range(num_players):
+        col, row = i % cols, i // cols
+        # horizontal & vertical offset within the grid cell
+        tl = (int(col * width / cols + (width / cols - side) / 2),
+              int(row * height / rows + (height / rows - side) / 2))
+        spaces.append((tl, (tl[0] + side, tl[1] + side)))
+
+    playspace = {"spaces":spaces, "side":side, "cols":cols, "rows":rows}
+    # Names used by the two player layout
+    playspace["ltl"], playspace["lbr"] = spaces[0]
+    if num_players > 1:
+        playspace["rtl"], playspace["rbr"] = spaces[1]
+    return playspace
+
+class OverlayCompositor:
+    """
+    Alpha blends solid color overlays into an image. Overlays are rasterized
+    into one mask and only the region they cover is blended, so the cost
+    depends on the overlay size and not on the frame size or how many
+    shapes there are. Buffers are kept between calls and only reallocated
+    when the frame size changes.
+    """
+    def __init__(self):
+        self._mask = None
+        self._scaled = None
+
+    def _buffers(self, shape):
+        if self._mask is None or self._mask.shape != shape[:2] or self._scaled.shape != shape:
+            self._mask = np.zeros(shape[:2], np.uint8)
+            self._scaled = np.empty(shape, np.uint8)
+        return self._mask, self._scaled
+
+    # Returns (x0, y0, x1, y1) clipped to the image, or None when nothing is left
+    @staticmethod
+    def _clip(img, x0, y0, x1, y1):
+        x0, y0 = max(int(x0), 0), max(int(y0), 0)
+        x1, y1 = min(int(x1), img.shape[1]), min(int(y1), img.shape[0])
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return x0, y0, x1, y1
+
+    # Blends color into sub (in place) where mask is set, or everywhere without a mask
+    def _blend(self, sub, scaled, color, alpha, mask=None):
+        # sub * (1 - alpha) + color * alpha, with the color added as a scalar
+        #   so no solid color image is needed
+        cv2.addWeighted(sub, 1 - alpha, sub, 0, 0, scaled)
+        shade = tuple(float(c) * alpha for c in color) + (0.0,) * (4 - len(color))
+        cv2.add(scaled, shade, sub, mask)
+
+    def blend_rect(self, img, tl, br, color, alpha):
+        """
+        Blends a filled rectangle (corners included, like cv2.rectangle) into img in place.
+        """
+        roi = self._clip(img, tl[0], tl[1], br[0] + 1, br[1] + 1)
+        if roi is None:
+            return img
+        x0, y0, x1, y1 = roi
+        _, scaled = self._buffers(img.shape)
+        self._blend(img[y0:y1, x0:x1], scaled[y0:y1, x0:x1], color, alpha)
+        return img
+
+    def blend_polys(self, img, polys, color, alpha):
+        """
+        Blends filled polygons into img in place. Overlapping polygons are only blended once.
+        """
+        if len(polys) == 0:
+            return img
+        x, y, w, h = cv2.boundingRect(np.concatenate([p.reshape(-1, 2) for p in polys]).astype(np.int32))
+        roi = self._clip(img, x, y, x + w, y + h)
+        if roi is None:
+            return img
+        x0, y0, x1, y1 = roi
+        mask, scaled = self._buffers(img.shape)
+        mask_sub = mask[y0:y1, x0:x1]
+        mask_sub[:] = 0
+        cv2.fillPoly(mask_sub, pts=list(polys), color=255, offset=(-x0, -y0))
+        self._blend(img[y0:y1, x0:x1], scaled[y0:y1, x0:x1], color, alpha, mask_sub)
+        return img
+
+# Shared by the drawing functions below
+compositor = OverlayCompositor()
 
 # draw_playspace will draw the playspace on the frame passed in.
 #   It does not draw on a copy
 def draw_playspace(frame, playspace):
-    overlay = frame.copy()
-
-    cv2.rectangle(overlay, playspace["ltl"], playspace["lbr"],
-        (255, 255, 255), -1)
     alpha = 0.1
-    cv2.addWeighted(overlay, alpha, frame, 1 - alpha,
-        0, frame)
-
-    cv2.rectangle(overlay, playspace["rtl"], playspace["rbr"],
-        (255, 255, 255), -1)
-    cv2.addWeighted(overlay, alpha, frame, 1 - alpha,
-        0, frame)
+    for tl, br in playspace["spaces"]:
+        compositor.blend_rect(frame, tl, br, (255, 255, 255), alpha)
     return frame
 
-# crop_playspace will crop out the playspace from the flame to player 0 and player 1 space
+# Converts a point in pixels of a playspace side pixels wide to world space
+#   (Config.WORLD_SPACE_SIZE). None stays None.
+def to_world(pixel_coord, side):
+    if pixel_coord is None:
+        return None
+    scale = Config.WORLD_SPACE_WIDTH / side
+    return (min(int(pixel_coord[0] * scale), Config.WORLD_SPACE_WIDTH - 1),
+            min(int(pixel_coord[1] * scale), Config.WORLD_SPACE_WIDTH - 1))
+
+# Converts a point in world space to pixels of a playspace side pixels wide
+def to_pixels(world_coord, side):
+    if world_coord is None:
+        return None
+    scale = side / Config.WORLD_SPACE_WIDTH
+    return (int(world_coord[0] * scale), int(world_coord[1] * scale))
+
+# crop_playspace will crop out the given player's playspace from the frame
 def crop_playspace(frame, playspace, player):
     # Crop frame space to playerspace
     # crop_img = img[y:y+h, x:x+w]
-    if player == PLAYER_ONE:
-        return frame[playspace["ltl"][1]:playspace["lbr"][1], playspace["ltl"][0]:playspace["lbr"][0]]
-    else:
-        return frame[playspace["rtl"][1]:playspace["rbr"][1], playspace["rtl"][0]:playspace["rbr"][0]]
+    tl, br = playspace["spaces"][player]
+    return frame[tl[1]:br[1], tl[0]:br[0]]
 
 # Colors on the resulting debug image contour borders
 #   Contours will be drawn with different colors
@@ -108,14 +209,14 @@ colors = [
 # Draws contours and fills in the area on an image.
 def draw_contours(img, contours, color=None, alpha=0.5):
     contoured = img.copy()
-    ci = 0
-    for cnt in contours:
-        overlay = contoured.copy()
-        c = color or colors[ci%len(colors)]
-        cv2.fillPoly(overlay, pts=[cnt], color=c)
-        cv2.addWeighted(overlay, alpha, contoured, 1.0-alpha, 0, contoured)
-        cv2.drawContours(contoured, cnt, -1, c, 8)
-        ci += 1
+    # Every contour of the same color is filled in one blend
+    by_color = {}
+    for ci, cnt in enumerate(contours):
+        by_color.setdefault(color or colors[ci%len(colors)], []).append(cnt)
+    for c, cnts in by_color.items():
+        compositor.blend_polys(contoured, cnts, c, alpha)
+    for ci, cnt in enumerate(contours):
+        cv2.drawContours(contoured, cnt, -1, color or colors[ci%len(colors)], 8)
     return contoured
 
 # https://stackoverflow.com/questions/10469235/opencv-apply-mask-to-a-color-image
@@ -4,6 +4,8 @@ import argparse
 import time
 import pdb
 
+import Config
+import FrameSource
 import Utility as util
 
 IS_CV3 = cv2.getVersionMajor() == 3
@@ -16,13 +18,27 @@ FLIP_IMAGES = True
 #   Params:
 #       frame           Full image frame, including both wands, one, or none
 #       color           Color to search for
+#       labels          FrameLabels of the frame to share with other players, or None
 #   Returns:
 #       pixel_coord  Returns coordinate for COLOR wand, if present. None otherwise
-def get_coords(frame, playspace, player_num):
+def get_coords(frame, playspace, player_num, labels=None):
+    if labels is not None:
+        return find_wand_label(labels.crop(player_num), player_num)
+
     cropped = util.crop_playspace(frame, playspace, player_num)
-    hsv = gaus_and_hsv(cropped)
 
-    return find_wand_hsv_filter(hsv, util.COLOR_ORDER[player_num])
+    return find_wand_bgr(cropped, player_num)
+
+# Finds every player's wand in a single classification pass over the
+#   playspaces (see FrameLabels), however many players there are.
+#   Params:
+#       frame           Full BGR image frame
+#       playspace       Playspace returned by util.playable_space
+#   Returns:
+#       list of pixel_coord (or None), indexed by player number
+def get_all_coords(frame, playspace):
+    labels = FrameLabels.for_frame(frame, playspace)
+    return [get_coords(frame, playspace, i, labels) for i in range(len(playspace["spaces"]))]
 
 # Get the player color for a given player number
 def get_player_color(player_num):
@@ -39,17 +55,26 @@ def main():
                         help="use camera instead of image")
     parser.add_argument('-v', metavar='VIDEO_CAME', type=int,
                       help='Choose video camera', default=0)
+    parser.add_argument("-s", help="video file or directory of images to use instead of a camera")
+    parser.add_argument("--fast", action='store_true',
+                        help="play the -s source as fast as possible")
+    parser.add_argument("--headless", action='store_true',
+                        help="do not show any windows, only print the detected points")
     args = parser.parse_args()
 
-    cv2.namedWindow("painted", cv2.WINDOW_NORMAL)
-    cv2.namedWindow("debug-1", cv2.WINDOW_NORMAL)
-    cv2.namedWindow("debug-2", cv2.WINDOW_NORMAL)
-    cv2.namedWindow("playspace", cv2.WINDOW_NORMAL)
+    if not args.headless:
+        cv2.namedWindow("painted", cv2.WINDOW_NORMAL)
+        cv2.namedWindow("debug-1", cv2.WINDOW_NORMAL)
+        cv2.namedWindow("debug-2", cv2.WINDOW_NORMAL)
+        cv2.namedWindow("playspace", cv2.WINDOW_NORMAL)
     # cv2.resizeWindow("painted", (900, 900))
     # cv2.resizeWindow("debug", (900, 900))
 
 
-    if args.c == False:
+    if args.s is not None:
+        print("Using source: %s" % args.s)
+        handle_source(FrameSource.open_source(args.s, fast=args.fast), args.headless)
+    elif args.c == False:
         print("Using single image: %s" % args.i)
         points = handle_single_img(args.i)
         final = img = cv2.imread(args.i)
@@ -63,16 +88,25 @@ def main():
 
 # Used for debugging to use the webcam
 def handle_webcam(cam):
-    cap = cv2.VideoCapture(cam)
     # uvcdynctrl -f
     # cap.set(3,800) # Width
     # cap.set(4,600) # Height
+    handle_source(FrameSource.CameraSource(cam))
+
+# Used for debugging with any frame source (camera, video file, directory of images).
+#   When headless, nothing is shown and the detected points are printed instead.
+def handle_source(cap, headless=False):
     # 3 Wand types
     points = [[], [], []]
     last_point = [time.time(), time.time(), time.time()]
+    frames = 0
+    start_time = time.time()
     while(True):
         # Capture frame-by-frame
         ret, frame = cap.read()
+        if not ret:
+            break
+        frames += 1
         if FLIP_IMAGES:
             frame = cv2.flip(frame, 1)
 
@@ -81,8 +115,9 @@ def handle_webcam(cam):
         # frame = frame[:480, :]
 
         ps = util.playable_space(frame)
-        dps = util.draw_playspace(frame.copy(),ps)
-        cv2.imshow('playspace',dps)
+        if not headless:
+            dps = util.draw_playspace(frame.copy(),ps)
+            cv2.imshow('playspace',dps)
 
         frame = util.crop_playspace(frame, ps, 1)
 
@@ -90,6 +125,9 @@ def handle_webcam(cam):
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
         frame_points = handle_frame(frame, False)
+        if headless:
+            print(frame_points)
+            continue
         for i in range(0, len(frame_points)):
             if frame_points[i] is not None:
                 if time.time() - last_point[i] > 0.5:
@@ -111,8 +149,11 @@ def handle_webcam(cam):
 
 
     # When everything done, release the capture
+    elapsed = util.get_elapsed_time(start_time)
+    print("Processed %d frames in %.1fs (%.1f fps)" % (frames, elapsed, frames / max(elapsed, 1e-6)))
     cap.release()
-    cv2.destroyAllWindows()
+    if not headless:
+        cv2.destroyAllWindows()
 
 
 # https://solarianprogrammer.com/2015/05/08/detect-red-circles-image-using-opencv/
@@ -122,20 +163,31 @@ def handle_single_img(imgsrc):
     return handle_frame(img)
 
 def find_pixel_range(img_hsv, brush_color):
-    return cv2.inRange(img_hsv, util.COLOR_HSV[brush_color][0], util.COLOR_HSV[brush_color][1])
+    low, high = util.COLOR_HSV[brush_color]
+    if low[0] <= high[0]:
+        return cv2.inRange(img_hsv, low, high)
+
+    # The hue range wraps around red (180 -> 0)
+    upper = cv2.inRange(img_hsv, (low[0], low[1], low[2]), (180, high[1], high[2]))
+    lower = cv2.inRange(img_hsv, (0, low[1], low[2]), (high[0], high[1], high[2]))
+    return cv2.bitwise_or(upper, lower)
 
 def find_contours_hsv_filter(img_hsv, brush_color, debug_image=False):
     # Manual tolerances
-    wand = cv2.inRange(img_hsv, util.COLOR_HSV[brush_color][0], util.COLOR_HSV[brush_color][1])
+    wand = find_pixel_range(img_hsv, brush_color)
 
     if not isinstance(debug_image, bool):
         cv2.imshow('debug-2', wand)
 
+    return find_contours(wand)
+
+# Finds the external contours of a binary mask
+def find_contours(mask):
     # the return signature is different in opencv 2 and opencv 3
     if IS_CV3:
-        _, contours, hierarchy = cv2.findContours(wand, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        _, contours, hierarchy = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     else:
-        contours, hierarchy = cv2.findContours(wand, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        contours, hierarchy = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
     return contours
 
@@ -161,30 +213,49 @@ def find_wand_hsv_filter(img_hsv, brush_color, debug_image=False):
 
 # Using grayscale to find the brightest points.
 #   Looks for a bright circle
-def find_wand_grayscale(img, brush_color):
+def find_wand_grayscale(img, brush_color, debug=False):
     g = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
     ret, threshold = cv2.threshold(g, 245, 255, cv2.THRESH_BINARY)
 
-    contours, hierarchy = cv2.findContours(threshold, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    contours = find_contours(threshold)
     circs = filter_circle_contours(contours)
-    circs_img = util.draw_contours(img, circs)
-    cv2.imshow('debug-1', circs_img)
-    cv2.imshow('debug-2', threshold)
+    if debug:
+        circs_img = util.draw_contours(img, circs)
+        cv2.imshow('debug-1', circs_img)
+        cv2.imshow('debug-2', threshold)
 
     return get_points_from_contours(circs)
 
+# Finds the center of the biggest blob in a binary mask, using connected
+#   components instead of contours
+def find_wand_components(mask):
+    count, _, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    if count < 2:
+        return None
+
+    # Label 0 is the background. Like contours with no area, blobs only one
+    #   pixel wide or high are ignored.
+    areas = stats[1:, cv2.CC_STAT_AREA].copy()
+    areas[(stats[1:, cv2.CC_STAT_WIDTH] < 2) | (stats[1:, cv2.CC_STAT_HEIGHT] < 2)] = 0
+    best = np.argmax(areas)
+    if areas[best] < MIN_WAND_PIXELS:
+        return None
+    cX, cY = centroids[best + 1]
+    return (int(cX), int(cY))
+
 def get_points_from_contours(contours):
     # get the biggest contour (this should be our wand head)
     biggest_contour = None
+    biggest_area = 0
     for cnt in contours:
         # Based on area?
-        if cv2.contourArea(cnt) < 1:
+        area = cv2.contourArea(cnt)
+        if area < 1:
             continue
-        if biggest_contour is None:
+        if biggest_contour is None or area > biggest_area:
             biggest_contour = cnt
-        elif cv2.contourArea(cnt) > cv2.contourArea(biggest_contour):
-            bdfiggest_contour = cnt
+            biggest_area = area
 
     # given a contour, find the center
     if biggest_contour is not None:
@@ -215,6 +286,395 @@ def handle_frame(img, debug=False):
     # find_wand_grayscale(img, 'green')
     return points
 
+# Label 0 in a label map means "no wand". Player n is labeled n + 1.
+NO_PLAYER = 0
+
+# Most player colors a label map can tell apart, one bit each in the tables
+MAX_LUT_COLORS = 8
+
+# HSV -> player label lookup tables, rebuilt whenever the calibrated ranges
+#   in util.COLOR_HSV change
+_lut_cache = {"key": None, "lut": None}
+
+def _in_hue_range(hue, low, high):
+    # A lower hue bound above the upper bound wraps around red (180 -> 0)
+    if low <= high:
+        return (hue >= low) & (hue <= high)
+    return (hue >= low) | (hue <= high)
+
+def build_color_lut(color_order=None, color_hsv=None):
+    """
+    Builds the lookup tables classify_frame uses. Rows 0 to 2 map a hue,
+    saturation or value to the bits of the players whose range contains it
+    (player n is bit n), so ANDing the three gives every player whose range
+    contains the pixel. Row 3 maps those bits to the label of the lowest
+    player, so when ranges overlap the earlier player in the color order wins.
+    The tables take 1 KB and stay in cache.
+
+    :param color_order: player colors, defaults to util.COLOR_ORDER
+    :param color_hsv: HSV ranges by color, defaults to util.COLOR_HSV
+    :return: uint8 array of 4x256 entries
+    """
+    color_order = util.COLOR_ORDER if color_order is None else color_order
+    color_hsv = util.COLOR_HSV if color_hsv is None else color_hsv
+    if len(color_order) > MAX_LUT_COLORS:
+        raise ValueError("Too many colors for the lookup tables: %d (at most %d)" % (
+            len(color_order), MAX_LUT_COLORS))
+
+    values = np.arange(256)
+    lut = np.zeros((4, 256), np.uint8)
+    for player_num, color in enumerate(color_order):
+        low, high = color_hsv[color]
+        bit = np.uint8(1 << player_num)
+        lut[0, _in_hue_range(values, low[0], high[0])] |= bit
+        lut[1, (values >= low[1]) & (values <= high[1])] |= bit
+        lut[2, (values >= low[2]) & (values <= high[2])] |= bit
+
+    # Label of the lowest set bit, NO_PLAYER when there is none
+    for bits in range(1, 256):
+        lut[3, bits] = (bits & -bits).bit_length()
+    lut[3, 0] = NO_PLAYER
+    return lut
+
+def _color_lut_key():
+    return tuple((c, tuple(map(tuple, util.COLOR_HSV[c]))) for c in util.COLOR_ORDER)
+
+def get_color_lut():
+    """
+    Returns the lookup tables for the current calibration, building them on
+    first use and again after util.COLOR_HSV or util.COLOR_ORDER change.
+    """
+    key = _color_lut_key()
+    if _lut_cache["key"] != key:
+        _lut_cache["lut"] = build_color_lut()
+        _lut_cache["key"] = key
+    return _lut_cache["lut"]
+
+def classify_frame(img, lut=None):
+    """
+    Turns a BGR image into a per-pixel player label map. The image is
+    converted to HSV once and thresholded for every player in the same
+    pass, however many players there are. Labels are player_num + 1, or
+    NO_PLAYER.
+
+    :param img: BGR image (any view, including crops)
+    :param lut: lookup tables from build_color_lut, defaults to get_color_lut()
+    :return: uint8 label map with the same height and width as img
+    """
+    if lut is None:
+        lut = get_color_lut()
+
+    hue, sat, val = cv2.split(cv2.cvtColor(img, cv2.COLOR_BGR2HSV))
+    bits = cv2.LUT(hue, lut[0])
+    cv2.bitwise_and(bits, cv2.LUT(sat, lut[1]), bits)
+    cv2.bitwise_and(bits, cv2.LUT(val, lut[2]), bits)
+    return cv2.LUT(bits, lut[3])
+
+class FrameLabels:
+    """
+    The label map of a frame's playspaces, shared by every player's search.
+    Classification is one lookup per pixel however many players there are,
+    so each playspace is classified the first time it is searched as a whole
+    and never again. Playspaces the motion gate skips, or where the tracker
+    finds the wand in its window, are not classified at all.
+    """
+    def __init__(self, frame, playspace):
+        self.frame = frame
+        self.playspace = playspace
+        self._crops = {}
+
+    @staticmethod
+    def for_frame(frame, playspace):
+        """
+        :return: FrameLabels of the frame, or None when the selected detector
+            does not work on label maps
+        """
+        if Config.DETECTOR_BACKEND != "lut" or Config.PYRAMID_DETECTION:
+            return None
+        return FrameLabels(frame, playspace)
+
+    def crop(self, player_num):
+        """
+        :return: label map of a player's playspace, classifying it first if needed
+        """
+        labels = self._crops.get(player_num)
+        if labels is None:
+            labels = classify_frame(util.crop_playspace(self.frame, self.playspace, player_num))
+            self._crops[player_num] = labels
+        return labels
+
+def find_wand_label(labels, player_num):
+    """
+    Finds the center of the given player's wand head in a label map.
+
+    :param labels: label map from classify_frame
+    :param player_num: player to look for
+    :return: location of center of brush head: (x,y) or None if not found
+    """
+    mask = (labels == player_num + 1).view(np.uint8)
+    return get_points_from_contours(find_contours(mask))
+
+def find_wand_pyramid(img, player_num, downscale=None):
+    """
+    Coarse-to-fine search for a player's wand. Candidate blobs are found on
+    a copy sampled every `downscale` pixels, then the centroid is refined at
+    full resolution inside the biggest candidate's neighborhood only. A wand
+    head smaller than `downscale` pixels across can be missed.
+
+    :param img: BGR image (usually a playspace crop)
+    :param player_num: player to look for
+    :param downscale: sampling step, defaults to Config.PYRAMID_DOWNSCALE
+    :return: location of center of brush head: (x,y) or None if not found
+    """
+    if downscale is None:
+        downscale = Config.PYRAMID_DOWNSCALE
+    if downscale <= 1:
+        return find_wand_label(classify_frame(img), player_num)
+
+    # Striding only touches the sampled pixels, so this stays cheap as the
+    #   camera resolution grows
+    coarse = classify_frame(img[::downscale, ::downscale])
+    mask = (coarse == player_num + 1).view(np.uint8)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    if count < 2:
+        return None
+    best = 1 + np.argmax(stats[1:, cv2.CC_STAT_AREA])
+    x, y, w, h = stats[best, :4]
+
+    # Grow the candidate by one coarse pixel on every side
+    height, width = img.shape[:2]
+    x0 = max((x - 1) * downscale, 0)
+    y0 = max((y - 1) * downscale, 0)
+    x1 = min((x + w + 1) * downscale, width)
+    y1 = min((y + h + 1) * downscale, height)
+    point = find_wand_label(classify_frame(img[y0:y1, x0:x1]), player_num)
+    if point is None:
+        return None
+    return (int(point[0] + x0), int(point[1] + y0))
+
+# Blobs smaller than this many pixels are never a wand head
+MIN_WAND_PIXELS = 4
+
+# Detector backends by name. Each takes a BGR image and a player number and
+#   returns the center of that player's wand head: (x,y) or None if not found
+DETECTOR_BACKENDS = {}
+
+def detector_backend(name):
+    def register(detect):
+        DETECTOR_BACKENDS[name] = detect
+        return detect
+    return register
+
+@detector_backend("lut")
+def detect_lut(img, player_num):
+    # Lookup table classification (no HSV conversion), biggest contour
+    return find_wand_label(classify_frame(img), player_num)
+
+@detector_backend("contours")
+def detect_contours(img, player_num):
+    # HSV threshold, biggest contour
+    return find_wand_hsv_filter(gaus_and_hsv(img), util.COLOR_ORDER[player_num])
+
+@detector_backend("components")
+def detect_components(img, player_num):
+    # HSV threshold, biggest connected component
+    return find_wand_components(find_pixel_range(gaus_and_hsv(img), util.COLOR_ORDER[player_num]))
+
+@detector_backend("grayscale")
+def detect_grayscale(img, player_num):
+    # Brightest circle, whatever its color
+    return find_wand_grayscale(img, util.COLOR_ORDER[player_num])
+
+def set_detector_backend(name):
+    """
+    Selects the detector backend used from now on.
+
+    :param name: one of DETECTOR_BACKENDS
+    """
+    if name not in DETECTOR_BACKENDS:
+        raise ValueError("Unknown detector backend %r, choose one of: %s" % (
+            name, ", ".join(sorted(DETECTOR_BACKENDS))))
+    Config.DETECTOR_BACKEND = name
+
+def get_detector():
+    return DETECTOR_BACKENDS[Config.DETECTOR_BACKEND]
+
+def find_wand_bgr(img, player_num):
+    """
+    Searches a whole BGR image for a player's wand with the selected
+    detector backend, using pyramid detection when Config.PYRAMID_DETECTION
+    is on and the lookup table backend is selected.
+    """
+    if Config.PYRAMID_DETECTION and Config.DETECTOR_BACKEND == "lut":
+        return find_wand_pyramid(img, player_num)
+    return get_detector()(img, player_num)
+
+# Half the width of the square window searched around a predicted
+#   wand position, in playspace pixels
+TRACKER_WINDOW = 40
+
+class WandTracker:
+    """
+    Tracks each player's wand by predicting its next position from the
+    player's recent coordinates (constant velocity) and only classifying a
+    small window around the prediction. When there is no recent history or
+    the wand is not in the window, it falls back to scanning the whole
+    playspace.
+    """
+    def __init__(self, window=TRACKER_WINDOW):
+        self.window = window
+        # The last two detections of each player. Players store simplified
+        #   strokes, so their points are too far apart to predict from.
+        self._recent = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.searches = 0
+        self.window_hits = 0
+        self.full_scans = 0
+        self.misses = 0
+
+    def predict(self, player_num, player):
+        """
+        Predicts where the player's wand will be on this frame.
+
+        :param player_num: player to predict
+        :param player: Player, whose last_draw_time tells if the detections are recent
+        :return: ((x, y), search radius) or None if there is nothing recent
+        """
+        previous, last = self._recent.get(player_num, (None, None))
+        if last is None:
+            return None
+        if util.get_elapsed_time(player.last_draw_time) > Config.DRAW_TIMEOUT:
+            return None
+
+        if previous is None:
+            return (last, self.window)
+
+        vx = last[0] - previous[0]
+        vy = last[1] - previous[1]
+        # Widen the window for fast strokes, which are harder to predict
+        radius = self.window + max(abs(vx), abs(vy))
+        return ((last[0] + vx, last[1] + vy), radius)
+
+    def get_coords(self, frame, playspace, player_num, player, labels=None):
+        """
+        Same as VidProcessor.get_coords, but searches around the predicted
+        position first.
+
+        :param labels: FrameLabels of the frame shared with other players, or None
+        :return: pixel_coord for the player's wand, if present. None otherwise
+        """
+        point = self._search(frame, playspace, player_num, player, labels)
+        self._recent[player_num] = (self._recent.get(player_num, (None, None))[1], point)
+        return point
+
+    def _search(self, frame, playspace, player_num, player, labels):
+        cropped = util.crop_playspace(frame, playspace, player_num)
+        self.searches += 1
+
+        prediction = self.predict(player_num, player)
+        if prediction is not None:
+            (px, py), radius = prediction
+            height, width = cropped.shape[:2]
+            x0 = min(max(int(px) - radius, 0), width)
+            y0 = min(max(int(py) - radius, 0), height)
+            x1 = min(max(int(px) + radius, 0), width)
+            y1 = min(max(int(py) + radius, 0), height)
+            if x1 > x0 and y1 > y0:
+                point = get_detector()(cropped[y0:y1, x0:x1], player_num)
+                if point is not None:
+                    self.window_hits += 1
+                    return (point[0] + x0, point[1] + y0)
+
+        # Lost the wand (or never had it), search the whole playspace
+        self.full_scans += 1
+        if labels is not None:
+            point = find_wand_label(labels.crop(player_num), player_num)
+        else:
+            point = find_wand_bgr(cropped, player_num)
+        if point is None:
+            self.misses += 1
+        return point
+
+    def get_all_coords(self, frame, playspace, players):
+        labels = FrameLabels.for_frame(frame, playspace)
+        return [self.get_coords(frame, playspace, i, p, labels) for i, p in enumerate(players)]
+
+    def fallback_rate(self):
+        """
+        :return: fraction of searches that needed a full playspace scan
+        """
+        return self.full_scans / max(self.searches, 1)
+
+    def report(self):
+        return "tracker: %d searches, %d window hits, %d full scans (%.0f%%), %d misses" % (
+            self.searches, self.window_hits, self.full_scans,
+            self.fallback_rate() * 100, self.misses)
+
+# Playspaces are sampled every MOTION_STEP pixels when looking for motion
+MOTION_STEP = 4
+
+class MotionGate:
+    """
+    Skips detection for playspaces that have not changed. Each playspace is
+    sampled every MOTION_STEP pixels and compared with the samples taken
+    the last time detection ran there. While nothing changed by more than
+    the threshold, the last detection result is reused.
+    """
+    def __init__(self, threshold=None, step=MOTION_STEP):
+        """
+        :param threshold: change in any color channel (0-255) that counts as
+            motion, defaults to Config.MOTION_THRESHOLD
+        :param step: sampling step in pixels
+        """
+        self.threshold = Config.MOTION_THRESHOLD if threshold is None else threshold
+        self.step = step
+        self.reset()
+
+    def reset(self):
+        self._reference = {}
+        self._last_coords = {}
+        self.checks = {}
+        self.skips = {}
+
+    def is_static(self, player_num, cropped):
+        """
+        :return: True when the playspace has not changed since the last detection
+        """
+        sample = np.ascontiguousarray(cropped[::self.step, ::self.step])
+        reference = self._reference.get(player_num)
+        self.checks[player_num] = self.checks.get(player_num, 0) + 1
+        if reference is not None and reference.shape == sample.shape:
+            diff = cv2.absdiff(sample, reference)
+            if not np.any(diff > self.threshold):
+                self.skips[player_num] = self.skips.get(player_num, 0) + 1
+                return True
+        self._reference[player_num] = sample
+        return False
+
+    def get_all_coords(self, frame, playspace, detect):
+        """
+        :param detect: function of a player number that returns that player's pixel_coord
+        :return: list of pixel_coord (or None), indexed by player number
+        """
+        coords = []
+        for player_num in range(len(playspace["spaces"])):
+            cropped = util.crop_playspace(frame, playspace, player_num)
+            if not self.is_static(player_num, cropped):
+                self._last_coords[player_num] = detect(player_num)
+            coords.append(self._last_coords[player_num])
+        return coords
+
+    def skip_rate(self, player_num):
+        return self.skips.get(player_num, 0) / max(self.checks.get(player_num, 0), 1)
+
+    def report(self):
+        return "motion gate: " + ", ".join(
+            "player %d skipped %d/%d (%.0f%%)" % (i + 1, self.skips.get(i, 0), self.checks[i],
+                                                 self.skip_rate(i) * 100)
+            for i in sorted(self.checks))
+
 def filter_circle_contours(contours):
     # Find the circular contours
     # http://layer0.authentise.com/detecting-circular-shapes-using-contours.html
@@ -1,6 +1,10 @@
+import argparse
 import cv2
 from halo import Halo
 from colorama import init as colorama_init, Fore
+import Config
+import Profiles
+import VidProcessor
 from GameEngine import GameEngine
 from Utility import HideOutput
 
@@ -57,7 +61,33 @@ def choose_camera():
 
 
 def main():
-    game = GameEngine(choose_camera())
+    parser = argparse.ArgumentParser(description='Light Drawing')
+    parser.add_argument("-s", "--source",
+                        help="video file or directory of images to play instead of a camera")
+    parser.add_argument("-c", "--cameras", nargs='+', metavar="SOURCE",
+                        help="one camera index (or video file) per player, in player order")
+    parser.add_argument("--fast", action='store_true',
+                        help="play the source as fast as possible instead of in real time")
+    parser.add_argument("--headless", action='store_true',
+                        help="run without a window, starting every round automatically")
+    parser.add_argument("-p", "--profile", choices=Profiles.list_profiles(), default=Config.LIGHTING_PROFILE,
+                        help="lighting profile saved by Calibrate.py to load")
+    parser.add_argument("-b", "--backend", choices=sorted(VidProcessor.DETECTOR_BACKENDS),
+                        help="wand detector backend (default: %s)" % Config.DETECTOR_BACKEND)
+    args = parser.parse_args()
+
+    if args.profile is not None:
+        Profiles.load_profile(args.profile)
+    if args.backend is not None:
+        VidProcessor.set_detector_backend(args.backend)
+
+    if args.cameras is not None:
+        source = args.cameras
+    elif args.source is not None:
+        source = args.source
+    else:
+        source = choose_camera()
+    game = GameEngine(source, headless=args.headless, fast=args.fast)
     game.run_engine()
 
 